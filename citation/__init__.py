@@ -3,10 +3,7 @@ Citation extraction tool for PDF files and URLs.
 Supports Chicago Author-Date style citations.
 """
 
-from .main import CitationExtractor
-from .model import CitationLLM
-from .utils import is_url, is_pdf_file, is_media_file
-from .citation_style import format_bibliography
+import importlib
 
 __version__ = "0.10.0"
 __all__ = [
@@ -17,3 +14,27 @@ __all__ = [
     "is_media_file",
     "format_bibliography",
 ]
+
+# Public names are loaded on first access (PEP 562) so that importing the
+# package, e.g. for the CLI's --help, does not pull in PyMuPDF, DSPy, etc.
+_LAZY_ATTRS = {
+    "CitationExtractor": ".main",
+    "CitationLLM": ".model",
+    "is_url": ".utils",
+    "is_pdf_file": ".utils",
+    "is_media_file": ".utils",
+    "format_bibliography": ".citation_style",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional, faster JSON
+    orjson = None
+
+
+def get_cache_dir(*parts: str) -> str:
+    """
+    Return (and create) a directory under the user cache directory.
+    Honours $XDG_CACHE_HOME, defaulting to ~/.cache/citation.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    path = os.path.join(base, "citation", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_digest(file_path: str) -> str:
+    """
+    Hash a file's contents without reading it into memory at once.
+
+    Repeated calls for an unchanged file (same size and mtime) reuse the
+    previous hash.
+    """
+    stat = os.stat(file_path)
+    return _file_digest(os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _file_digest(file_path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """Combine several values into a single filesystem-safe cache key."""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_result(
+    key: str, namespace: str = "extract", max_age: Optional[float] = None
+) -> Optional[Dict]:
+    """
+    Return the cached result for key, or None on a miss.
+
+    Entries older than max_age seconds, if given, count as misses.
+    """
+    path = os.path.join(get_cache_dir(namespace), f"{key}.json")
+    try:
+        with open(path, "rb") as f:
+            age = time.time() - os.fstat(f.fileno()).st_mtime
+            if max_age is not None and age > max_age:
+                return None
+            raw = f.read()
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable cache entry %s: %s", path, e)
+        return None
+
+
+def save_result(key: str, data: Dict, namespace: str = "extract") -> None:
+    """Store a result atomically so readers never see partial files."""
+    cache_dir = get_cache_dir(namespace)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            if orjson is not None:
+                f.write(orjson.dumps(data))
+            else:
+                f.write(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        os.replace(tmp_path, os.path.join(cache_dir, f"{key}.json"))
+    except OSError as e:
+        logger.warning("Could not write cache entry %s: %s", key, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_file(key: str, namespace: str, suffix: str) -> Optional[str]:
+    """Return the path of a cached file for key, or None on a miss."""
+    path = os.path.join(get_cache_dir(namespace), f"{key}{suffix}")
+    return path if os.path.exists(path) else None
+
+
+def save_file(key: str, src_path: str, namespace: str, suffix: str) -> Optional[str]:
+    """Copy a file into the cache atomically; return its cached path."""
+    cache_dir = get_cache_dir(namespace)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path)
+        path = os.path.join(cache_dir, f"{key}{suffix}")
+        os.replace(tmp_path, path)
+        return path
+    except OSError as e:
+        logger.warning("Could not write cache entry %s: %s", key, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
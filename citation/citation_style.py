@@ -1,9 +1,18 @@
 import os
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # optional, faster JSON
+    orjson = None
 from citeproc import Citation, CitationItem, CitationStylesStyle, CitationStylesBibliography
 from citeproc.source.json import CiteProcJSON
 from typing import Dict, List
 import logging
 
+logger = logging.getLogger(__name__)
+
 def get_style_path(style_name: str) -> str:
     """
     Gets the full path to a CSL style file.
@@ -31,49 +40,72 @@ def get_style_path(style_name: str) -> str:
 
     return None # Return None if not found
 
-def format_bibliography(csl_json_data: List[Dict], style_name: str) -> (str, str):
+def format_bibliography(
+    csl_json_data: List[Dict], style_name: str, enable_cache: bool = True
+) -> (str, str):
     """
     Formats a bibliography and in-text citations using citeproc-py.
+    Identical (data, style) pairs are served from an in-memory cache unless
+    enable_cache is False; failures are not cached.
     """
+    style_path = get_style_path(style_name)
+    if not style_path:
+        return f"Error: Style '{style_name}' not found.", ""
     try:
-        style_path = get_style_path(style_name)
-        if not style_path:
-            return f"Error: Style '{style_name}' not found.", ""
-
-        bib_source = CiteProcJSON(csl_json_data)
-        bib_style = CitationStylesStyle(style_path, validate=False)
-        
-        bibliography = CitationStylesBibliography(bib_style, bib_source)
-
-        # Create and register Citation objects
-        citations_to_register = []
-        for item in csl_json_data:
-            citation_id = item.get('id')
-            if citation_id:
-                citation = Citation([CitationItem(citation_id)])
-                bibliography.register(citation)
-                citations_to_register.append(citation)
-
-        # Generate the formatted bibliography
-        formatted_bib_list = bibliography.bibliography()
-        formatted_bib = "\n".join(str(item) for item in formatted_bib_list)
-
-        # Generate a sample in-text citation for the first item
-        formatted_citation = ""
-        if citations_to_register:
-            # Use the first registered citation to generate the in-text format
-            in_text_citation = citations_to_register[0]
-            # We need to provide a callback function to cite()
-            def callback(s):
-                pass
-            if hasattr(bibliography.style, 'citation'):
-                bibliography.cite(in_text_citation, callback)
-                formatted_citation = str(in_text_citation)
-            else:
-                formatted_citation = "No in-text citation format defined in this style."
-
-        return formatted_bib, formatted_citation
-
+        if enable_cache:
+            return _format_bibliography_cached(_dumps_sorted(csl_json_data), style_path)
+        return _format_bibliography(csl_json_data, style_path)
     except Exception as e:
-        logging.error(f"Error formatting citation: {e}", exc_info=True)
-        return f"Error during formatting: {e}", ""
\ No newline at end of file
+        logger.error("Error formatting citation: %s", e)
+        logger.debug("Citation formatting traceback", exc_info=True)
+        return f"Error during formatting: {e}", ""
+
+
+def _dumps_sorted(data) -> bytes:
+    """Serialize data with sorted keys, for use as a cache key."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+
+@lru_cache(maxsize=256)
+def _format_bibliography_cached(csl_json: bytes, style_path: str) -> (str, str):
+    # Exceptions propagate, so lru_cache only keeps successful results
+    loads = orjson.loads if orjson is not None else json.loads
+    return _format_bibliography(loads(csl_json), style_path)
+
+
+def _format_bibliography(csl_json_data: List[Dict], style_path: str) -> (str, str):
+    bib_source = CiteProcJSON(csl_json_data)
+    bib_style = CitationStylesStyle(style_path, validate=False)
+    
+    bibliography = CitationStylesBibliography(bib_style, bib_source)
+
+    # Create and register Citation objects
+    citations_to_register = []
+    for item in csl_json_data:
+        citation_id = item.get('id')
+        if citation_id:
+            citation = Citation([CitationItem(citation_id)])
+            bibliography.register(citation)
+            citations_to_register.append(citation)
+
+    # Generate the formatted bibliography
+    formatted_bib_list = bibliography.bibliography()
+    formatted_bib = "\n".join(str(item) for item in formatted_bib_list)
+
+    # Generate a sample in-text citation for the first item
+    formatted_citation = ""
+    if citations_to_register:
+        # Use the first registered citation to generate the in-text format
+        in_text_citation = citations_to_register[0]
+        # We need to provide a callback function to cite()
+        def callback(s):
+            pass
+        if hasattr(bibliography.style, 'citation'):
+            bibliography.cite(in_text_citation, callback)
+            formatted_citation = str(in_text_citation)
+        else:
+            formatted_citation = "No in-text citation format defined in this style."
+
+    return formatted_bib, formatted_citation
\ No newline at end of file
@@ -1,10 +1,13 @@
 import argparse
-import sys
-import os
+import asyncio
 import logging
-from citation.main import CitationExtractor
-from citation.llm import get_provider_info
-from citation.citation_style import format_bibliography
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from citation import logging_config
+from citation.llm import DEFAULT_LLM_MODEL, get_provider_info
+
+logger = logging.getLogger(__name__)
 
 
 def main():
@@ -14,7 +17,9 @@ def main():
 
     # Input (auto-detected)
     parser.add_argument(
-        "input", help="Path to PDF file or URL to extract citation from"
+        "input",
+        nargs="+",
+        help="Path(s) to PDF/media files or URLs to extract citations from",
     )
 
     # Document type option
@@ -35,6 +40,12 @@ def main():
     parser.add_argument(
         "--verbose", "-v", action="store_true", help="Enable verbose logging"
     )
+    parser.add_argument(
+        "--quiet",
+        "-q",
+        action="store_true",
+        help="Only log warnings and errors; useful for large batches",
+    )
 
     # Language option for OCR
     parser.add_argument(
@@ -44,6 +55,17 @@ def main():
         help="Language for OCR (default: eng+chi_sim+chi_tra)",
     )
 
+    # Page segmentation option for OCR
+    parser.add_argument(
+        "--psm",
+        type=int,
+        choices=range(14),
+        metavar="{0..13}",
+        help="Tesseract page segmentation mode for scanned PDFs, e.g. 6 for a "
+        "single block of text or 1 for multi-column pages "
+        "(default: automatic layout analysis)",
+    )
+
     # Page range option for OCR
     parser.add_argument(
         "--page-range",
@@ -57,8 +79,9 @@ def main():
     providers_help = "; ".join([f"{k}: {v}" for k, v in provider_info.items()])
     parser.add_argument(
         "--llm",
-        default="ollama/qwen3",
-        help=f"LLM model to use for citation extraction (default: ollama/qwen3). "
+        default=DEFAULT_LLM_MODEL,
+        help=f"LLM model to use for citation extraction (default: {DEFAULT_LLM_MODEL}, "
+        f"set by $CITATION_LLM_MODEL). "
         f"Supported providers: {providers_help}. "
         f"Examples: ollama/qwen3, gemini/gemini-1.5-flash",
     )
@@ -72,57 +95,70 @@ def main():
              "Place CSL files in the 'citation/styles' directory."
     )
 
+    # Output format option
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=["text", "json"],
+        default="text",
+        help="Output format: human-readable text with the formatted bibliography, "
+        "or one CSL JSON object per line for piping (default: text)",
+    )
+
+    # Cache option
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached results and LLM responses and rerun the full extraction",
+    )
+
+    # Batch option
+    parser.add_argument(
+        "--concurrency",
+        "-j",
+        type=int,
+        default=8,
+        help="Maximum number of inputs processed at the same time (default: 8)",
+    )
+
     args = parser.parse_args()
 
     # Configure logging
-    if args.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
-    else:
-        logging.getLogger().setLevel(logging.INFO)
+    logging_config.configure(args.verbose, args.quiet)
 
+    # Imported only after argument parsing so that --help and usage errors
+    # do not load the whole extraction stack
+    from citation.main import CitationExtractor
+    from citation.utils import is_url, ocr_jobs_per_document
+
+    # Missing files are reported up front, so a run without any usable input
+    # never builds the extractor or preloads the model
+    inputs = []
+    missing = 0
+    for input_source in args.input:
+        if is_url(input_source) or os.path.isfile(input_source):
+            inputs.append(input_source)
+        else:
+            print(f"File does not exist: {input_source}", file=sys.stderr)
+            missing += 1
+    if not inputs:
+        sys.exit(1)
+
+    extractor = None
     try:
         # Initialize extractor with selected LLM model
         if args.verbose:
-            print(f"Using LLM model: {args.llm}")
-        extractor = CitationExtractor(llm_model=args.llm)
-
-        # Auto-detect input type and process
-        print(f"Processing: {args.input}")
-        csl_data = extractor.extract_citation(
-            args.input,
-            output_dir=args.output_dir,
-            doc_type_override=args.type,
-            lang=args.lang,
-            page_range=args.page_range,
+            print(f"Using LLM model: {args.llm}", file=sys.stderr)
+        # Documents processed at the same time share the CPUs for OCR
+        documents = min(max(1, args.concurrency), len(inputs))
+        extractor = CitationExtractor(
+            llm_model=args.llm,
+            ocr_jobs=ocr_jobs_per_document(documents),
+            enable_cache=not args.no_cache,
         )
 
-        if csl_data:
-            print("\n" + "=" * 50)
-            print("CITATION EXTRACTED SUCCESSFULLY")
-            print("=" * 50)
-            
-            # Display raw CSL data
-            for key, value in csl_data.items():
-                print(f"{key.replace('_', ' ').title()}: {value}")
-            print(f"\nCitation files saved to: {args.output_dir}")
-
-            # Display formatted bibliography
-            print("\n" + "=" * 50)
-            print(f"FORMATTED BIBLIOGRAPHY ({args.citation_style})")
-            print("=" * 50)
-            
-            bibliography, in_text_citation = format_bibliography([csl_data], args.citation_style)
-            
-            print(bibliography)
-            
-            print("\n" + "=" * 50)
-            print("IN-TEXT CITATION")
-            print("=" * 50)
-            print(in_text_citation)
-
-
-        else:
-            print("Failed to extract citation information.", file=sys.stderr)
+        failures = asyncio.run(_run(extractor, args, inputs))
+        if failures or missing:
             sys.exit(1)
 
     except KeyboardInterrupt:
@@ -130,11 +166,98 @@ def main():
         sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
-        if args.verbose:
-            import traceback
-
-            traceback.print_exc()
+        # Shown with --verbose, which enables debug logging
+        logger.debug("Unexpected error traceback", exc_info=True)
         sys.exit(1)
+    finally:
+        if extractor is not None:
+            extractor.close()
+
+
+async def _run(extractor, args, inputs) -> int:
+    """Process all inputs concurrently and print each result as it completes.
+
+    Returns the number of inputs that failed.
+    """
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+    # The default executor can be smaller than --concurrency on small machines
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    )
+
+    async def bounded(input_source: str):
+        async with semaphore:
+            # Progress goes to stderr so that stdout carries only results
+            if not args.quiet:
+                print(f"Processing: {input_source}", file=sys.stderr)
+            csl_data = await asyncio.to_thread(
+                extractor.extract_citation,
+                input_source,
+                output_dir=args.output_dir,
+                doc_type_override=args.type,
+                lang=args.lang,
+                page_range=args.page_range,
+                psm=args.psm,
+                use_cache=not args.no_cache,
+            )
+            return input_source, csl_data
+
+    failures = 0
+    for next_done in asyncio.as_completed([bounded(p) for p in inputs]):
+        input_source, csl_data = await next_done
+        if csl_data:
+            _print_result(csl_data, args)
+        else:
+            print(
+                f"Failed to extract citation information from: {input_source}",
+                file=sys.stderr,
+            )
+            failures += 1
+    return failures
+
+
+def _print_result(csl_data: dict, args) -> None:
+    """Print the extracted CSL data and its formatted bibliography."""
+    if args.format == "json":
+        _write_json_line(csl_data)
+        return
+
+    from citation.citation_style import format_bibliography
+
+    bibliography, in_text_citation = format_bibliography([csl_data], args.citation_style)
+
+    rule = "=" * 50
+    lines = ["", rule, "CITATION EXTRACTED SUCCESSFULLY", rule]
+
+    # Display raw CSL data
+    lines += [
+        f"{key.replace('_', ' ').title()}: {value}" for key, value in csl_data.items()
+    ]
+    lines += ["", f"Citation files saved to: {args.output_dir}"]
+
+    # Display formatted bibliography
+    lines += ["", rule, f"FORMATTED BIBLIOGRAPHY ({args.citation_style})", rule]
+    lines.append(bibliography)
+
+    lines += ["", rule, "IN-TEXT CITATION", rule]
+    lines.append(in_text_citation)
+
+    # One write per result keeps concurrent results from interleaving
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def _write_json_line(csl_data: dict) -> None:
+    """Write a CSL JSON object as a single line."""
+    try:
+        import orjson
+    except ImportError:
+        import json
+
+        sys.stdout.write(json.dumps(csl_data, ensure_ascii=False) + "\n")
+    else:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(csl_data) + b"\n")
+        sys.stdout.buffer.flush()
 
 
 if __name__ == "__main__":
@@ -1,11 +1,70 @@
-import dspy
 import logging
-from typing import Dict, Optional
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict
 
+if TYPE_CHECKING:
+    import dspy
 
-def get_llm_model(model_name: str = "ollama/qwen3", temperature: float = 0.1) -> dspy.LM:
+logger = logging.getLogger(__name__)
+
+# DSPy's chat adapter closes every structured answer with this marker, after
+# all output fields. Stopping there skips decoding any trailing commentary.
+COMPLETION_STOP = ["[[ ## completed ## ]]"]
+
+# Context window requested from Ollama. Prompts are capped at a few thousand
+# tokens (the combined journal prompt sends four pages), so 8192 fits them
+# without truncation while keeping the KV cache far smaller than a model's
+# full window. Override with $CITATION_OLLAMA_NUM_CTX.
+OLLAMA_NUM_CTX = int(os.environ.get("CITATION_OLLAMA_NUM_CTX", "8192"))
+
+OLLAMA_BASE_URL = "http://localhost:11434"
+
+# Model used when none is given; override with $CITATION_LLM_MODEL, e.g. to
+# pick a quantized tag (see the README)
+DEFAULT_LLM_MODEL = os.environ.get("CITATION_LLM_MODEL", "ollama/qwen3")
+
+# How long Ollama keeps the model loaded after a request. Ollama's default of
+# five minutes lets the model unload between slow documents of a batch, and
+# reloading it takes seconds. Override with $CITATION_OLLAMA_KEEP_ALIVE.
+OLLAMA_KEEP_ALIVE = os.environ.get("CITATION_OLLAMA_KEEP_ALIVE", "30m")
+
+
+def preload_model(model_name: str) -> None:
+    """
+    Ask Ollama to load a model into memory ahead of the first prompt.
+
+    Does nothing for other providers. Failures (e.g. Ollama not running) are
+    only logged at debug level; the first real request reports them.
+    """
+    if not model_name.startswith("ollama/"):
+        return
+
+    from .utils import http_session
+
+    try:
+        response = http_session.post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            json={"model": model_name.split("/", 1)[1], "keep_alive": OLLAMA_KEEP_ALIVE},
+            timeout=300,
+        )
+        response.raise_for_status()
+        logger.debug("Preloaded Ollama model %s", model_name)
+    except Exception as e:
+        logger.debug("Could not preload Ollama model %s: %s", model_name, e)
+
+
+@lru_cache(maxsize=8)
+def get_llm_model(
+    model_name: str = DEFAULT_LLM_MODEL, temperature: float = 0.1, cache: bool = True
+) -> "dspy.LM":
     """
     Get a configured LLM model based on the model name.
+
+    Instances are memoized per (model_name, temperature, cache), so every
+    CitationExtractor/CitationLLM for the same model shares one client. dspy.LM
+    keeps no per-request state, so sharing it across threads is safe; do not
+    mutate the returned object.
     
     Args:
         model_name: Model name in format "provider/model" 
@@ -14,39 +73,55 @@ def get_llm_model(model_name: str = "ollama/qwen3", temperature: float = 0.1) ->
                    - "gemini/gemini-1.5-flash", "gemini/gemini-2.0-flash-exp", "gemini/gemini-2.5-flash"
                    - Any valid Gemini model name supported by Google AI
         temperature: Temperature for the model (default: 0.1 for more deterministic outputs)
+        cache: Reuse responses for prompts that were already answered (in memory
+               and on disk), skipping the LLM round-trip on a hit
     
     Returns:
         Configured dspy.LM instance
     """
+    # Imported here so that reading provider info does not load DSPy
+    import dspy
+
     if model_name.startswith("gemini/"):
         # Extract the actual model name (e.g., "gemini-1.5-flash" from "gemini/gemini-1.5-flash")
         actual_model = model_name.split("/", 1)[1]
-        logging.info(f"Using Gemini model: {actual_model} with temperature: {temperature}")
+        logger.info("Using Gemini model: %s with temperature: %s", actual_model, temperature)
         # Use the full model name with gemini/ prefix for proper provider detection
         return dspy.LM(
             model=f"gemini/{actual_model}",
+            cache=cache,
+            stop=COMPLETION_STOP,
             model_kwargs={"temperature": temperature}
         )
     
     elif model_name.startswith("ollama/"):
         # Keep the full model name with ollama/ prefix for LiteLLM compatibility
-        logging.info(f"Using Ollama model: {model_name} with temperature: {temperature}")
+        logger.info("Using Ollama model: %s with temperature: %s", model_name, temperature)
         return dspy.LM(
             model=model_name, 
-            base_url="http://localhost:11434",
+            base_url=OLLAMA_BASE_URL,
+            cache=cache,
+            stop=COMPLETION_STOP,
+            num_ctx=OLLAMA_NUM_CTX,
+            keep_alive=OLLAMA_KEEP_ALIVE,
             model_kwargs={"temperature": temperature}
         )
     
     else:
         # Default to Ollama for backward compatibility
-        logging.warning(f"Unknown model format: {model_name}, defaulting to Ollama")
+        logger.warning("Unknown model format: %s, defaulting to Ollama", model_name)
         return dspy.LM(
             model=model_name, 
-            base_url="http://localhost:11434",
+            base_url=OLLAMA_BASE_URL,
+            cache=cache,
+            stop=COMPLETION_STOP,
+            num_ctx=OLLAMA_NUM_CTX,
+            keep_alive=OLLAMA_KEEP_ALIVE,
             model_kwargs={"temperature": temperature}
         )
 
 
+@lru_cache(maxsize=1)
 def get_provider_info() -> Dict[str, str]:
     """
     Get information about supported providers and their URL formats.
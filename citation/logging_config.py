@@ -0,0 +1,26 @@
+import logging
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_configured = False
+
+
+def configure(verbose: bool = False, quiet: bool = False) -> None:
+    """
+    Configure root logging for command-line use.
+
+    quiet hides the per-step progress messages and keeps only warnings and
+    errors. The handler is installed only once per process; later calls just
+    adjust the level.
+    """
+    global _configured
+    if verbose:
+        level = logging.DEBUG
+    elif quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    if not _configured:
+        logging.basicConfig(level=level, format=LOG_FORMAT)
+        _configured = True
+    logging.getLogger().setLevel(level)
@@ -1,52 +1,112 @@
-import trafilatura
+from __future__ import annotations
+
 import os
-import subprocess
-import logging
 import json
-import fitz  # PyMuPDF
-from datetime import datetime
-from typing import Dict, Optional
+import logging
+import re
 import tempfile
-from pymediainfo import MediaInfo
+from datetime import date
+from collections import deque
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 import asyncio
-from crawl4ai import AsyncWebCrawler
+import atexit
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
 
 from .utils import (
     clean_url,
+    extract_html_meta,
+    fetch_page,
+    ocr_jobs_per_document,
     extract_publisher_from_domain,
     is_url,
-    is_pdf_file,
-    is_media_file,
+    has_media_extension,
+    sniff_file_type,
     ensure_searchable_pdf,
-    extract_pdf_text,
     determine_url_type,
+    known_url_type,
     save_citation,
     to_csl_json,
     create_subset_pdf,
+    ocr_sidecar_path,
+    read_ocr_sidecar,
 )
 from .type_judge import determine_document_type
-from .model import CitationLLM
+from .llm import DEFAULT_LLM_MODEL, preload_model
+from . import cache
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
+
+    from .model import CitationLLM
+
+# Progress messages go through logging so that library users only see them
+# when they opt in; the CLI configures INFO level.
+logger = logging.getLogger(__name__)
+
+# A four-digit year inside a longer date string
+YEAR_RE = re.compile(r"\b(\d{4})\b")
+
+# Web pages change, so their citations are only reused for a day
+URL_CACHE_TTL = 24 * 60 * 60
 
 # --- Essential Fields for Early Exit ---
 ESSENTIAL_FIELDS = {
-    "book": ["title", "author", "year", "publisher"],
-    "thesis": ["title", "author", "year", "publisher", "genre"],
-    "journal": ["title", "author", "container-title", "year", "page_numbers"], # volume/issue handled separately
-    "bookchapter": ["title", "author", "container-title", "editor", "publisher", "page_numbers"],
+    "book": frozenset(["title", "author", "year", "publisher"]),
+    "thesis": frozenset(["title", "author", "year", "publisher", "genre"]),
+    "journal": frozenset(["title", "author", "container-title", "year", "page_numbers"]), # volume/issue handled separately
+    "bookchapter": frozenset(["title", "author", "container-title", "editor", "publisher", "page_numbers"]),
 }
 
 
+# Extractor of an extract_many worker process. It is built inside the worker on
+# first use, so the LLM client never has to be pickled.
+_worker_extractor = None
+
+
+def _extract_in_worker(
+    extractor_cls, init_kwargs: Dict, input_source: str, kwargs: Dict
+) -> Optional[Dict]:
+    global _worker_extractor
+    if _worker_extractor is None:
+        _worker_extractor = extractor_cls(**init_kwargs)
+    try:
+        return _worker_extractor.extract_citation(input_source, **kwargs)
+    finally:
+        # Pool workers may exit without running atexit hooks
+        _worker_extractor.flush()
+
+
+async def _gather_in_threads(func, inputs: List[str], concurrency: int, **kwargs) -> List:
+    """
+    Run func on every input in worker threads, at most `concurrency` at once.
+
+    A dedicated pool is used because asyncio's default executor has only a
+    few threads on small machines, which would cap concurrency below the
+    requested value.
+    """
+    if not inputs:
+        return []
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(inputs)))) as pool:
+        return await asyncio.gather(
+            *(
+                loop.run_in_executor(pool, partial(func, input_source, **kwargs))
+                for input_source in inputs
+            )
+        )
+
+
 def _has_all_essential_fields(citation_info: Dict, doc_type: str) -> bool:
     """Check if all essential fields for the doc type are present."""
-    required_fields = ESSENTIAL_FIELDS.get(doc_type, [])
-    has_required = all(field in citation_info for field in required_fields)
+    required_fields = ESSENTIAL_FIELDS.get(doc_type)
+    if required_fields is None:
+        return True
 
-    if not has_required:
+    if required_fields - citation_info.keys():
         return False
 
     if doc_type == "journal":
@@ -56,10 +116,109 @@ def _has_all_essential_fields(citation_info: Dict, doc_type: str) -> bool:
     return True
 
 
+def _merge_page_numbers(citation_info: Dict, page_number_info: Dict) -> None:
+    """Apply the pattern-based page range, which wins over the LLM's guess."""
+    if "page_numbers" in page_number_info:
+        citation_info["page_numbers"] = page_number_info["page_numbers"]
+        logger.info("📄 Page numbers extracted by improved method: %s", citation_info['page_numbers'])
+
+
 class CitationExtractor:
-    def __init__(self, llm_model="ollama/qwen3"):
-        """Initialize the citation extractor."""
-        self.llm = CitationLLM(llm_model)
+    def __init__(
+        self,
+        llm_model=DEFAULT_LLM_MODEL,
+        ocr_jobs: Optional[int] = None,
+        enable_cache: bool = True,
+        llm_parallel: int = 2,
+        preload: bool = True,
+    ):
+        """
+        Initialize the citation extractor.
+
+        Args:
+            llm_model: LLM model name in "provider/model" format.
+            ocr_jobs: Maximum number of parallel OCR workers (default: one per
+                page, up to the CPU count).
+            enable_cache: Let the LLM answer repeated prompts from its
+                response cache instead of calling the model again.
+            llm_parallel: Maximum number of LLM requests in flight for one
+                document. Ollama serves them concurrently only up to its
+                OLLAMA_NUM_PARALLEL setting.
+            preload: Start loading a local Ollama model in the background now,
+                so that OCR and PDF parsing overlap the model's cold start.
+
+        Citation files are written by a background thread; call close() when
+        done to write every pending file and stop the thread.
+        """
+        self.llm_model = llm_model
+        self._enable_cache = enable_cache
+        self._llm = None
+        self._llm_lock = threading.Lock()
+        self.ocr_jobs = ocr_jobs
+        self.llm_parallel = max(1, llm_parallel)
+        if preload:
+            threading.Thread(
+                target=preload_model, args=(llm_model,), daemon=True
+            ).start()
+
+        self._save_queue = queue.Queue()
+        self._save_thread = threading.Thread(target=self._save_worker, daemon=True)
+        self._save_thread.start()
+        # Pending writes are still flushed if the caller never calls close()
+        atexit.register(self.close)
+
+    @property
+    def llm(self) -> CitationLLM:
+        """
+        The LLM client, created on first use.
+
+        Building it imports DSPy, which takes seconds, so runs answered from
+        the result cache or without any LLM call never pay for it.
+        """
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    from .model import CitationLLM
+
+                    self._llm = CitationLLM(
+                        self.llm_model, enable_cache=self._enable_cache
+                    )
+        return self._llm
+
+    def _save(self, csl_data: Dict, output_dir: str) -> None:
+        """Queue a citation file write; the copy keeps later edits out of it."""
+        if self._save_thread is None:
+            # Closed: write directly
+            save_citation(csl_data, output_dir)
+            return
+        self._save_queue.put((dict(csl_data), output_dir))
+
+    def _save_worker(self) -> None:
+        while True:
+            item = self._save_queue.get()
+            try:
+                if item is None:
+                    return
+                save_citation(*item)
+            except Exception as e:
+                # A failed write must not stop the thread, or later writes
+                # and close() would wait forever
+                logger.error("Error saving citation: %s", e)
+            finally:
+                self._save_queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until all queued citation files have been written."""
+        self._save_queue.join()
+
+    def close(self) -> None:
+        """Write all queued citation files and stop the writer thread."""
+        save_thread, self._save_thread = self._save_thread, None
+        if save_thread is None:
+            return
+        self._save_queue.put(None)
+        save_thread.join()
+        atexit.unregister(self.close)
 
     def extract_citation(
         self,
@@ -68,40 +227,294 @@ class CitationExtractor:
         doc_type_override: Optional[str] = None,
         lang: str = "eng+chi_sim",
         page_range: str = "1-5, -3",
+        use_cache: bool = True,
+        psm: Optional[int] = None,
     ) -> Optional[Dict]:
-        """Main function to extract citation from either PDF or URL."""
+        """
+        Main function to extract citation from either PDF or URL.
+
+        PDF and media results are cached by file content and extraction
+        settings, URL results by cleaned URL for URL_CACHE_TTL seconds; pass
+        use_cache=False to always rerun the pipeline. psm sets Tesseract's
+        page segmentation mode for scanned PDFs.
+        """
         try:
             # Validate input
             if not input_source or not input_source.strip():
-                logging.error("Input source is empty or None")
+                logger.error("Input source is empty or None")
                 return None
 
-            # Auto-detect input type with improved error handling
+            # Auto-detect input type with improved error handling. URLs are
+            # recognized from the string alone; local inputs are checked with
+            # a single stat, then by header and extension.
             if is_url(input_source):
-                logging.info(f"Detected URL input: {input_source}")
-                return self.extract_from_url(input_source, output_dir)
-            elif is_pdf_file(input_source):
-                logging.info(f"Detected PDF input: {input_source}")
-                return self.extract_from_pdf(
-                    input_source, output_dir, doc_type_override, lang, page_range
+                logger.info("Detected URL input: %s", input_source)
+                return self._extract_cached(
+                    input_source,
+                    output_dir,
+                    lambda: self.extract_from_url(
+                        input_source,
+                        output_dir,
+                        doc_type_override,
+                        lang,
+                        page_range,
+                        use_cache=use_cache,
+                        psm=psm,
+                    ),
+                    # The PDF settings matter when the URL serves a PDF
+                    cache.make_key(
+                        clean_url(input_source),
+                        doc_type_override or "auto",
+                        lang,
+                        page_range,
+                        psm,
+                        self.llm_model,
+                    )
+                    if use_cache
+                    else None,
+                    namespace="url",
+                    max_age=URL_CACHE_TTL,
+                )
+
+            if not os.path.isfile(input_source):
+                logger.error("File does not exist: %s", input_source)
+                return None
+
+            file_type = sniff_file_type(input_source)
+            if file_type == "pdf":
+                logger.info("Detected PDF input: %s", input_source)
+                return self._extract_cached(
+                    input_source,
+                    output_dir,
+                    lambda: self.extract_from_pdf(
+                        input_source,
+                        output_dir,
+                        doc_type_override,
+                        lang,
+                        page_range,
+                        use_cache=use_cache,
+                        psm=psm,
+                    ),
+                    cache.make_key(
+                        cache.file_digest(input_source),
+                        doc_type_override or "auto",
+                        lang,
+                        page_range,
+                        psm,
+                        self.llm_model,
+                    )
+                    if use_cache
+                    else None,
+                )
+            elif file_type == "media" or has_media_extension(input_source):
+                logger.info("Detected media file input: %s", input_source)
+                return self._extract_cached(
+                    input_source,
+                    output_dir,
+                    lambda: self.extract_from_media_file(input_source, output_dir),
+                    # The title falls back to the file name, so it is part
+                    # of the key
+                    cache.make_key(
+                        cache.file_digest(input_source),
+                        "media",
+                        os.path.basename(input_source),
+                    )
+                    if use_cache
+                    else None,
                 )
-            elif is_media_file(input_source):
-                logging.info(f"Detected media file input: {input_source}")
-                return self.extract_from_media_file(input_source, output_dir)
             else:
-                logging.error(f"Unknown or unsupported input type: {input_source}")
-                if os.path.exists(input_source):
-                    logging.error(f"File exists but is not a supported format")
-                else:
-                    logging.error(f"File does not exist: {input_source}")
+                logger.error("Unknown or unsupported input type: %s", input_source)
+                logger.error("File exists but is not a supported format")
                 return None
         except Exception as e:
-            logging.error(f"Error in citation extraction: {e}")
-            import traceback
-
-            logging.debug(traceback.format_exc())
+            logger.error("Error in citation extraction: %s", e)
+            # The traceback is only formatted when debug output is enabled
+            logger.debug("Citation extraction traceback", exc_info=True)
             return None
 
+    def _extract_cached(
+        self,
+        input_source: str,
+        output_dir: str,
+        extract,
+        cache_key: Optional[str],
+        namespace: str = "extract",
+        max_age: Optional[float] = None,
+    ) -> Optional[Dict]:
+        """Return the cached result for cache_key, or run extract() and store it."""
+        if cache_key:
+            csl_data = cache.load_result(cache_key, namespace, max_age)
+            if csl_data:
+                logger.info("Using cached citation for: %s", input_source)
+                self._save(csl_data, output_dir)
+                return csl_data
+        csl_data = extract()
+        if csl_data and cache_key:
+            cache.save_result(cache_key, csl_data, namespace)
+        return csl_data
+
+    async def batch_extract(
+        self, inputs: List[str], concurrency: int = 10, **kwargs
+    ) -> List[Optional[Dict]]:
+        """
+        Extract citations for several inputs concurrently.
+
+        Network waits of one input overlap with the work on others, so a batch
+        of URLs takes roughly as long as its slowest fetch rather than the sum.
+        At most `concurrency` inputs run at once; keyword arguments are passed
+        on to extract_citation. Results are returned in input order.
+        """
+        return await _gather_in_threads(
+            self.extract_citation, inputs, concurrency, **kwargs
+        )
+
+    async def extract_from_urls(
+        self, urls: List[str], output_dir: str = "example", concurrency: int = 16
+    ) -> List[Optional[Dict]]:
+        """
+        Extract citations for a list of URLs, up to `concurrency` at a time.
+
+        Like batch_extract, but skips input type detection and allows more
+        inputs in flight, since URL work is almost entirely network waits.
+        Results are returned in input order.
+        """
+        return await _gather_in_threads(
+            self.extract_from_url, urls, concurrency, output_dir=output_dir
+        )
+
+    @classmethod
+    def extract_many(
+        cls,
+        paths: List[str],
+        num_workers: Optional[int] = None,
+        init_kwargs: Optional[Dict] = None,
+        **kwargs,
+    ) -> List[Optional[Dict]]:
+        """
+        Extract citations for many PDF files in parallel worker processes.
+
+        Unlike batch_extract, PyMuPDF parsing and text extraction of different
+        files run on separate cores. Each worker builds its own extractor from
+        init_kwargs; keyword arguments are passed on to extract_citation.
+        num_workers defaults to the CPU count, capped at 4. Unless init_kwargs
+        sets ocr_jobs, the workers share the CPUs for OCR. Results are
+        returned in input order.
+        """
+        if not paths:
+            return []
+        if num_workers is None:
+            num_workers = min(os.cpu_count() or 1, 4)
+        num_workers = min(num_workers, len(paths))
+        # The workers OCR side by side, so they split the CPUs between them
+        init_kwargs = dict(init_kwargs or {})
+        init_kwargs.setdefault("ocr_jobs", ocr_jobs_per_document(num_workers))
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            return list(
+                pool.map(
+                    _extract_in_worker,
+                    repeat(cls),
+                    repeat(init_kwargs),
+                    paths,
+                    repeat(kwargs),
+                )
+            )
+
+    @staticmethod
+    def _load_cached_ocr(key: str) -> Optional[tuple]:
+        """Return (searchable_pdf_path, pages) from the OCR cache, or None."""
+        pdf_path = cache.load_file(key, "ocr", ".pdf")
+        entry = cache.load_result(key, namespace="ocr")
+        if pdf_path and entry:
+            return pdf_path, entry["pages"]
+        return None
+
+    @staticmethod
+    def _save_cached_ocr(key: str, searchable_pdf_path: str, pages: List[str]) -> None:
+        """Store the searchable page subset and its text in the OCR cache."""
+        if cache.save_file(key, searchable_pdf_path, "ocr", ".pdf"):
+            cache.save_result(key, {"pages": pages}, namespace="ocr")
+
+    @staticmethod
+    def _determine_document_type(
+        pdf: Union[str, fitz.Document], num_pages: int, cache_key: Optional[str] = None
+    ) -> str:
+        """
+        Classify the document, reusing the stored answer for the same file.
+
+        cache_key is the OCR cache key, which already covers the file content
+        and page range the classification depends on.
+        """
+        if cache_key:
+            entry = cache.load_result(cache_key, namespace="doctype")
+            if entry:
+                return entry["doc_type"]
+        doc_type = determine_document_type(pdf, num_pages)
+        if cache_key:
+            cache.save_result(cache_key, {"doc_type": doc_type}, namespace="doctype")
+        return doc_type
+
+    @staticmethod
+    def _extract_all_page_texts(doc: fitz.Document) -> List[str]:
+        """Extract the text of every page in one pass over an open document."""
+        return [page.get_text("text") for page in doc]
+
+    def _extract_fields_iteratively(
+        self,
+        pages: List[str],
+        doc_type: str,
+        citation_info: Dict,
+        page_numbers_future: Optional[Future] = None,
+    ) -> None:
+        """
+        Prompt the LLM page by page until all essential fields are found.
+
+        Up to `llm_parallel` page prompts run at once; answers are merged in
+        page order, so earlier pages take precedence.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.llm_parallel)
+        pending = deque()
+        next_page = 0
+
+        def submit_next_page():
+            nonlocal next_page
+            logger.info("  - Processing page %d of %d...", next_page + 1, len(pages))
+            pending.append(
+                executor.submit(
+                    self.llm.extract_citation_from_text, pages[next_page], doc_type
+                )
+            )
+            next_page += 1
+
+        try:
+            while next_page < len(pages) and len(pending) < self.llm_parallel:
+                submit_next_page()
+
+            while pending:
+                current_citation = pending.popleft().result()
+
+                # Merge new findings into our main citation_info
+                for key, value in current_citation.items():
+                    if key not in citation_info:
+                        citation_info[key] = value
+
+                if page_numbers_future is not None:
+                    _merge_page_numbers(citation_info, page_numbers_future.result())
+                    page_numbers_future = None
+
+                # Check for early exit
+                if _has_all_essential_fields(citation_info, doc_type):
+                    logger.info("✅ All essential fields for '%s' found. Stopping early.", doc_type)
+                    break
+
+                if next_page < len(pages):
+                    submit_next_page()
+        finally:
+            # Don't wait for answers that are no longer needed
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if page_numbers_future is not None:
+            _merge_page_numbers(citation_info, page_numbers_future.result())
+
     def extract_from_pdf(
         self,
         input_pdf_path: str,
@@ -109,115 +522,179 @@ class CitationExtractor:
         doc_type_override: Optional[str] = None,
         lang: str = "eng+chi_sim",
         page_range: str = "1-5, -3",
+        use_cache: bool = True,
+        psm: Optional[int] = None,
+        url: Optional[str] = None,
     ) -> Optional[Dict]:
-        """Extract citation from PDF using the new efficient, iterative workflow."""
+        """
+        Extract citation from PDF using the new efficient, iterative workflow.
+
+        The searchable page subset and its text are cached by file content,
+        page range and OCR settings, so changing only the model or document
+        type does not repeat OCR; pass use_cache=False to always redo it.
+        url, if given, is recorded as the source the PDF was downloaded from.
+        """
+        import fitz  # PyMuPDF
+
         temp_pdf_path = None
+        ocr_cache_key = None
+        cached_ocr = None
+        searchable_doc = None
         try:
-            print(f"📄 Starting PDF citation extraction...")
+            logger.info("📄 Starting PDF citation extraction...")
 
-            # Step 1: Analyze original PDF for page count
-            print("🔍 Step 1: Analyzing original PDF structure...")
-            num_pages, _ = self._analyze_pdf_structure(input_pdf_path)
-            if num_pages == 0:
-                logging.error(f"Could not read PDF file: {input_pdf_path}")
-                return None
+            if use_cache:
+                ocr_cache_key = cache.make_key(
+                    cache.file_digest(input_pdf_path), lang, page_range, psm
+                )
+                cached_ocr = self._load_cached_ocr(ocr_cache_key)
+
+            # Steps 1 and 2 share a single parse of the original file
+            with fitz.open(input_pdf_path) as source_doc:
+                # Step 1: Analyze original PDF for page count
+                logger.info("🔍 Step 1: Analyzing original PDF structure...")
+                num_pages = self._analyze_pdf_structure(source_doc)
+                if num_pages == 0:
+                    logger.error("Could not read PDF file: %s", input_pdf_path)
+                    return None
+
+                # Step 2: Create a temporary subset PDF based on page_range
+                if not cached_ocr:
+                    logger.info("✂️ Step 2: Creating temporary PDF from page range '%s'...", page_range)
+                    temp_pdf_path = create_subset_pdf(
+                        input_pdf_path, page_range, num_pages, source_doc=source_doc
+                    )
 
-            # Step 2: Create a temporary subset PDF based on page_range
-            print(f"✂️ Step 2: Creating temporary PDF from page range '{page_range}'...")
-            temp_pdf_path = create_subset_pdf(input_pdf_path, page_range, num_pages)
-            if not temp_pdf_path:
-                return None # Error handled in create_subset_pdf
+            if cached_ocr:
+                logger.info("♻️ Steps 2-3: Using cached searchable pages...")
+                searchable_pdf_path, pages = cached_ocr
+            else:
+                if not temp_pdf_path:
+                    return None # Error handled in create_subset_pdf
 
-            # Step 3: Ensure the temporary PDF is searchable (OCR if needed)
-            print("🔍 Step 3: Ensuring temporary PDF is searchable...")
-            searchable_pdf_path = ensure_searchable_pdf(temp_pdf_path, lang)
+                # Step 3: Ensure the temporary PDF is searchable (OCR if needed)
+                logger.info("🔍 Step 3: Ensuring temporary PDF is searchable...")
+                searchable_pdf_path, ocr_ok = ensure_searchable_pdf(
+                    temp_pdf_path, lang, jobs=self.ocr_jobs, psm=psm
+                )
+                if not ocr_ok:
+                    # Neither the unsearchable pages nor anything derived from
+                    # them may be cached, or OCR would never be retried
+                    ocr_cache_key = None
+
+                # Read every page's text in a single pass; later steps index into it.
+                # Text recognized during OCR, if any, saves re-extracting it.
+                ocr_texts = read_ocr_sidecar(searchable_pdf_path) or []
+                # Kept open for step 4 instead of being parsed again there
+                searchable_doc = fitz.open(searchable_pdf_path)
+                pages = self._extract_all_page_texts(searchable_doc)
+                for i, ocr_text in enumerate(ocr_texts[: len(pages)]):
+                    if ocr_text is not None:
+                        pages[i] = ocr_text
+
+                if ocr_cache_key:
+                    self._save_cached_ocr(ocr_cache_key, searchable_pdf_path, pages)
 
             # Step 4: Determine document type
-            print("🔍 Step 4: Determining document type...")
-            doc = fitz.open(searchable_pdf_path)
-            temp_num_pages = doc.page_count
-            doc.close()
+            logger.info("🔍 Step 4: Determining document type...")
 
             if doc_type_override:
                 doc_type = doc_type_override
-                print(f"📋 Document type overridden to: {doc_type}")
+                logger.info("📋 Document type overridden to: %s", doc_type)
             else:
-                doc_type = determine_document_type(searchable_pdf_path, num_pages)
-                print(f"📋 Determined document type: {doc_type.upper()}")
+                doc_type = self._determine_document_type(
+                    searchable_doc or searchable_pdf_path, num_pages, ocr_cache_key
+                )
+                logger.info("📋 Determined document type: %s", doc_type.upper())
 
             citation_info = {}
 
-            # Step 5: Specialized page number extraction for journals and book chapters
+            # Step 5: Specialized page number extraction for journals and book chapters.
+            # Only the pattern-based pass runs here, in the background while the
+            # first LLM call below also asks for the page range.
+            page_numbers_future = None
+            remaining_pages = pages
             if doc_type in ["journal", "bookchapter"]:
-                print(f"🤖 Step 5: Specialized page number extraction for {doc_type}...")
-                doc = fitz.open(searchable_pdf_path)
-                if doc.page_count > 0:
-                    # Use improved pattern-based page extraction
-                    page_number_info = self.llm.extract_page_numbers_for_journal_chapter(
-                        searchable_pdf_path, page_range
+                logger.info("🤖 Step 5: Specialized page number extraction for %s...", doc_type)
+                executor = ThreadPoolExecutor(max_workers=1)
+                page_numbers_future = executor.submit(
+                    self.llm.extract_page_numbers_for_journal_chapter,
+                    searchable_pdf_path,
+                    page_range,
+                    use_llm=False,
+                )
+                executor.shutdown(wait=False)
+
+                if pages:
+                    # One prompt for the fields on the first page and the page range
+                    logger.info("🤖 Step 6: Extracting %s fields and page range together...", doc_type)
+                    citation_info.update(
+                        self.llm.extract_combined(
+                            pages[0],
+                            pages[1] if len(pages) > 1 else "",
+                            pages[-1],
+                            pages[-2] if len(pages) > 1 else "",
+                            doc_type,
+                        )
                     )
-                    if "page_numbers" in page_number_info:
-                        citation_info["page_numbers"] = page_number_info["page_numbers"]
-                        print(f"📄 Page numbers extracted by improved method: {citation_info['page_numbers']}")
-                doc.close()
-
-
-
+                    _merge_page_numbers(citation_info, page_numbers_future.result())
+                    page_numbers_future = None
+                    remaining_pages = pages[1:]
+            elif len(pages) > 1:
+                # Book and thesis details usually sit on the first few pages, so
+                # one prompt over the whole subset often answers everything
+                logger.info("🤖 Step 6: Extracting %s fields from all pages at once...", doc_type)
+                citation_info.update(
+                    self.llm.extract_citation_from_text("\n\n".join(pages), doc_type)
+                )
 
             # Step 6: Iterative LLM Extraction for all other fields
-            print(f"🤖 Step 6: Starting iterative LLM extraction for {doc_type}...")
-            accumulated_text = ""
-
-            doc = fitz.open(searchable_pdf_path)
-            for i in range(doc.page_count):
-                print(f"  - Processing page {i + 1} of {doc.page_count}...")
-                page_text = extract_pdf_text(searchable_pdf_path, page_number=i)
-                accumulated_text += page_text + "\n\n"
-
-                # Call LLM with the accumulated text
-                current_citation = self.llm.extract_citation_from_text(accumulated_text, doc_type)
-
-                # Merge new findings into our main citation_info
-                for key, value in current_citation.items():
-                    if key not in citation_info:
-                        citation_info[key] = value
-
-                # Check for early exit
-                if _has_all_essential_fields(citation_info, doc_type):
-                    print(f"✅ All essential fields for '{doc_type}' found. Stopping early.")
-                    break
-            doc.close()
+            if remaining_pages and not _has_all_essential_fields(citation_info, doc_type):
+                logger.info("🤖 Step 6: Starting iterative LLM extraction for %s...", doc_type)
+                self._extract_fields_iteratively(
+                    remaining_pages, doc_type, citation_info, page_numbers_future
+                )
+            elif page_numbers_future is not None:
+                _merge_page_numbers(citation_info, page_numbers_future.result())
 
             # Note: Online search step has been removed
             if not _has_all_essential_fields(citation_info, doc_type):
-                print(f"⚠️ Some essential fields for '{doc_type}' may be missing, but proceeding with available data.")
+                logger.warning("⚠️ Some essential fields for '%s' may be missing, but proceeding with available data.", doc_type)
 
             if not citation_info:
-                print("❌ Failed to extract any citation information with LLM.")
+                logger.warning("❌ Failed to extract any citation information with LLM.")
                 return None
 
+            if url:
+                citation_info["url"] = url
+                citation_info["date_accessed"] = date.today().isoformat()
+
             # Step 7: Convert to CSL JSON and save
-            print("💾 Step 7: Converting to CSL JSON and saving...")
+            logger.info("💾 Step 7: Converting to CSL JSON and saving...")
             csl_data = to_csl_json(citation_info, doc_type)
-            save_citation(csl_data, output_dir)
-            print("✅ Citation extraction completed successfully!")
+            self._save(csl_data, output_dir)
+            logger.info("✅ Citation extraction completed successfully!")
             return csl_data
 
         except Exception as e:
-            logging.error(f"Error extracting citation from PDF: {e}")
-            import traceback
-            logging.debug(traceback.format_exc())
+            logger.error("Error extracting citation from PDF: %s", e)
+            logger.debug("PDF extraction traceback", exc_info=True)
             return None
         finally:
+            if searchable_doc is not None:
+                searchable_doc.close()
             # Clean up the temporary file
             if temp_pdf_path and os.path.exists(temp_pdf_path):
                 os.remove(temp_pdf_path)
-                logging.info(f"Removed temporary file: {temp_pdf_path}")
+                logger.info("Removed temporary file: %s", temp_pdf_path)
             # If OCR created a file from a temp file, clean that up too
-            if 'searchable_pdf_path' in locals() and searchable_pdf_path != temp_pdf_path and os.path.exists(searchable_pdf_path):
+            if 'searchable_pdf_path' in locals() and not cached_ocr and searchable_pdf_path != temp_pdf_path and os.path.exists(searchable_pdf_path):
                  if "temp" in searchable_pdf_path.lower() or "tmp" in os.path.basename(searchable_pdf_path):
                     os.remove(searchable_pdf_path)
-                    logging.info(f"Removed temporary OCR file: {searchable_pdf_path}")
+                    logger.info("Removed temporary OCR file: %s", searchable_pdf_path)
+                    sidecar_path = ocr_sidecar_path(searchable_pdf_path)
+                    if os.path.exists(sidecar_path):
+                        os.remove(sidecar_path)
 
 
 
@@ -226,15 +703,26 @@ class CitationExtractor:
     ) -> Optional[Dict]:
         """Extract citation from a local video/audio file."""
         try:
-            print(f"📹 Starting media file citation extraction...")
-            media_info = MediaInfo.parse(input_media_path)
+            # Only needed for media files; loading libmediainfo is not free
+            from pymediainfo import MediaInfo
+
+            logger.info("📹 Starting media file citation extraction...")
+            # Citation fields and duration live in the container headers, so
+            # skip MediaInfo's default scan into the stream data. Its JSON
+            # report is read directly instead of building a Track object per
+            # stream; only the general track is used.
+            media_info = json.loads(
+                MediaInfo.parse(
+                    input_media_path, parse_speed=0, full=False, output="JSON"
+                )
+            )
             citation_info = {}
 
             # Extract metadata from the general track
-            general_track = media_info.tracks[0]
+            track_data = media_info["media"]["track"][0]
 
             # Title
-            title = getattr(general_track, "title", None)
+            title = track_data.get("Title")
             if title:
                 citation_info["title"] = title
             else:
@@ -243,92 +731,169 @@ class CitationExtractor:
                 citation_info["title"] = base_name.replace("_", " ").replace("-", " ")
 
             # Author/Performer
-            author = getattr(general_track, "performer", None) or getattr(
-                general_track, "artist", None
-            )
+            author = track_data.get("Performer") or track_data.get("Artist")
             if author:
                 citation_info["author"] = author
 
-            # Year
-            year = getattr(general_track, "recorded_date", None)
+            # Year; MediaInfo reports full timestamps such as
+            # "2019-05-03 10:11:12 UTC", so only the year is kept
+            year = YEAR_RE.search(str(track_data.get("Recorded_Date", "")))
             if year:
-                citation_info["year"] = str(year)
+                citation_info["year"] = year.group(1)
 
             # Publisher
-            publisher = getattr(general_track, "publisher", None)
+            publisher = track_data.get("Publisher")
             if publisher:
                 citation_info["publisher"] = publisher
 
-            # Duration
-            duration_ms = getattr(general_track, "duration", 0)
-            if duration_ms:
-                duration_s = int(duration_ms) // 1000
-                minutes = duration_s // 60
-                seconds = duration_s % 60
+            # Duration (the JSON report gives seconds, not milliseconds)
+            duration_s = track_data.get("Duration", 0)
+            if duration_s:
+                minutes, seconds = divmod(int(float(duration_s)), 60)
                 citation_info["duration"] = f"{minutes} min., {seconds} sec."
 
             # Determine media type for CSL
-            media_type = "audio" if general_track.track_type == "Audio" else "video"
+            media_type = "audio" if track_data.get("@type") == "Audio" else "video"
 
             # Save citation
             csl_data = to_csl_json(citation_info, media_type)
-            save_citation(csl_data, output_dir)
-            print("✅ Media citation extraction completed successfully!")
+            self._save(csl_data, output_dir)
+            logger.info("✅ Media citation extraction completed successfully!")
             return csl_data
 
         except Exception as e:
-            logging.error(f"Error extracting citation from media file: {e}")
+            logger.error("Error extracting citation from media file: %s", e)
             return None
 
-    def extract_from_url(self, url: str, output_dir: str = "example") -> Optional[Dict]:
-        """Extract citation from URL."""
+    def extract_from_url(
+        self,
+        url: str,
+        output_dir: str = "example",
+        doc_type_override: Optional[str] = None,
+        lang: str = "eng+chi_sim",
+        page_range: str = "1-5, -3",
+        use_cache: bool = True,
+        psm: Optional[int] = None,
+    ) -> Optional[Dict]:
+        """
+        Extract citation from URL.
+
+        The remaining arguments apply when the URL serves a PDF, as for
+        extract_from_pdf.
+        """
         try:
-            print(f"🌐 Starting URL citation extraction...")
+            logger.info("🌐 Starting URL citation extraction...")
+
+            # Most URLs are web pages, so start downloading the page while the
+            # HEAD request of the type check runs instead of after it.
+            # fetch_page stops at the response headers for media and other
+            # non-document bodies; URLs known as media by name need no HEAD
+            # request and are not prefetched.
+            page_download = None
+            if known_url_type(url) is None:
+                executor = ThreadPoolExecutor(max_workers=1)
+                page_download = executor.submit(fetch_page, clean_url(url))
+                executor.shutdown(wait=False)
 
             # Step 1: Determine URL type
-            print("🔍 Step 1: Determining URL type...")
+            logger.info("🔍 Step 1: Determining URL type...")
             url_type = determine_url_type(url)
-            print(f"📋 URL type: {url_type}")
+            logger.info("📋 URL type: %s", url_type)
+
+            # Non-HTML bodies skip the web page extractors entirely
+            if url_type == "pdf":
+                return self._extract_from_pdf_url(
+                    url,
+                    page_download,
+                    output_dir,
+                    doc_type_override=doc_type_override,
+                    lang=lang,
+                    page_range=page_range,
+                    use_cache=use_cache,
+                    psm=psm,
+                )
+            if url_type == "binary":
+                logger.warning("❌ URL is neither a web page, a PDF nor media")
+                return None
 
             # Step 2: Extract content based on URL type
             if url_type == "text":
-                print("🔍 Step 2: Extracting from text-based URL...")
-                citation_info = self._extract_from_text_url(url)
+                logger.info("🔍 Step 2: Extracting from text-based URL...")
+                citation_info = self._extract_from_text_url(url, page_download)
             else:
-                print("🔍 Step 2: Extracting media metadata...")
+                logger.info("🔍 Step 2: Extracting media metadata...")
                 citation_info = self._extract_media_metadata(url)
 
             # Step 3: Finalize and save citation
             if citation_info:
                 citation_info["url"] = url
-                citation_info["date_accessed"] = datetime.now().strftime("%Y-%m-%d")
+                citation_info["date_accessed"] = date.today().isoformat()
 
                 csl_type = "webpage" if url_type == "text" else "video"
 
-                print("💾 Step 4: Converting to CSL JSON and saving...")
+                logger.info("💾 Step 4: Converting to CSL JSON and saving...")
                 csl_data = to_csl_json(citation_info, csl_type)
-                save_citation(csl_data, output_dir)
+                self._save(csl_data, output_dir)
 
-                print("✅ URL citation extraction completed successfully!")
+                logger.info("✅ URL citation extraction completed successfully!")
                 return csl_data
             else:
-                print("❌ Failed to extract citation from URL")
+                logger.warning("❌ Failed to extract citation from URL")
                 return None
 
         except Exception as e:
-            logging.error(f"Error extracting citation from URL: {e}")
+            logger.error("Error extracting citation from URL: %s", e)
+            return None
+
+    def _extract_from_pdf_url(
+        self, url: str, page_download: Optional[Future], output_dir: str, **kwargs
+    ) -> Optional[Dict]:
+        """
+        Download a PDF served at url and run the PDF workflow on it.
+
+        Keyword arguments are passed on to extract_from_pdf.
+        """
+        logger.info("🔍 Step 2: Downloading PDF...")
+        if page_download is not None:
+            content = page_download.result()
+        else:
+            content = fetch_page(clean_url(url))
+        if not content:
+            logger.warning("❌ Failed to download PDF from URL")
             return None
 
-    def _extract_from_text_url(self, url: str) -> Dict:
-        """Extracts citation from a text-based URL, using crawl4ai as a fallback."""
+        fd, temp_pdf_path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            return self.extract_from_pdf(temp_pdf_path, output_dir, url=url, **kwargs)
+        finally:
+            os.remove(temp_pdf_path)
+
+    def _extract_from_text_url(
+        self, url: str, page_download: Optional[Future] = None
+    ) -> Dict:
+        """
+        Extracts citation from a text-based URL, using crawl4ai as a fallback.
+
+        page_download, if given, is an already started fetch_page of the
+        cleaned URL whose result is used instead of fetching again.
+        """
+        # Only needed for web pages; PDF and media runs never load it
+        import trafilatura
+
         citation_info = {}
         essential_fields = ["title", "author", "date", "container-title"]
 
+        downloaded = None
+
         # Step 1: Initial extraction with Trafilatura
         try:
-            print("🔍 Step 1: Extracting with trafilatura...")
-            cleaned_url = clean_url(url)
-            downloaded = trafilatura.fetch_url(cleaned_url)
+            logger.info("🔍 Step 1: Extracting with trafilatura...")
+            if page_download is not None:
+                downloaded = page_download.result()
+            else:
+                downloaded = fetch_page(clean_url(url))
             if downloaded:
                 metadata = trafilatura.extract_metadata(downloaded)
                 if metadata:
@@ -340,47 +905,69 @@ class CitationExtractor:
                         citation_info["date"] = metadata.date
                     if metadata.sitename:
                         citation_info["container-title"] = metadata.sitename
-                    print(f"📝 Trafilatura extraction: {len(citation_info)} fields found")
+                    logger.info("📝 Trafilatura extraction: %s fields found", len(citation_info))
+                # Fill gaps from <meta> tags before resorting to a browser crawl
+                for field, value in extract_html_meta(downloaded).items():
+                    if field not in citation_info:
+                        citation_info[field] = value
+                        logger.info("✅ Found missing '%s' in HTML meta tags.", field)
         except Exception as e:
-            logging.warning(f"Trafilatura failed: {e}")
+            logger.warning("Trafilatura failed: %s", e)
 
-        # Step 2: Check for missing fields and use crawl4ai if necessary
+        # Step 2: Check for missing fields and ask the LLM about the page text.
+        # The page already downloaded is used when trafilatura finds its main
+        # text; only pages without one (e.g. rendered by JavaScript) are
+        # fetched again with crawl4ai's browser.
         missing_fields = [field for field in essential_fields if field not in citation_info]
         if missing_fields:
-            print(f"⚠️ Missing essential fields: {', '.join(missing_fields)}. Using crawl4ai as fallback...")
+            logger.info("⚠️ Missing essential fields: %s.", ', '.join(missing_fields))
+            markdown_content = None
+            if downloaded:
+                # A failure here must not keep crawl4ai from trying
+                try:
+                    markdown_content = trafilatura.extract(
+                        downloaded, output_format="markdown"
+                    )
+                except Exception as e:
+                    logger.warning("Trafilatura text extraction failed: %s", e)
             try:
-                markdown_content = asyncio.run(self._extract_with_crawl4ai(url))
+                if not markdown_content:
+                    logger.info("Using crawl4ai as fallback...")
+                    markdown_content = asyncio.run(self._extract_with_crawl4ai(url))
                 if markdown_content:
-                    print("🤖 Step 2a: Extracting missing info with LLM from crawled content...")
+                    logger.info("🤖 Step 2a: Extracting missing info with LLM from page content...")
                     llm_extracted_info = self.llm.extract_citation_from_web_markdown(markdown_content)
                     
                     # Merge missing fields
                     for field in missing_fields:
                         if field in llm_extracted_info and field not in citation_info:
                             citation_info[field] = llm_extracted_info[field]
-                            print(f"✅ Found missing '{field}' with crawl4ai+LLM.")
+                            logger.info("✅ Found missing '%s' with LLM on page content.", field)
                 else:
-                    print("❌ crawl4ai did not return any content.")
+                    logger.warning("❌ crawl4ai did not return any content.")
             except Exception as e:
-                logging.error(f"crawl4ai fallback failed: {e}")
+                logger.error("Page content fallback failed: %s", e)
 
         # Step 3: Final check and logging
         final_missing = [field for field in essential_fields if field not in citation_info]
         if final_missing:
-            logging.warning(f"Could not extract the following fields: {', '.join(final_missing)}")
+            logger.warning("Could not extract the following fields: %s", ', '.join(final_missing))
         
         # Step 4: Extract container-title from domain if not provided
         if "container-title" not in citation_info:
             domain_publisher = extract_publisher_from_domain(url)
             if domain_publisher:
                 citation_info["container-title"] = domain_publisher
-                print(f"🏢 container-title derived from domain: {domain_publisher}")
+                logger.info("🏢 container-title derived from domain: %s", domain_publisher)
 
         return citation_info
 
     async def _extract_with_crawl4ai(self, url: str) -> str:
         """Crawls a single URL using crawl4ai and returns its markdown content."""
-        print("🕷️ Running crawl4ai...")
+        # Heavy (it drives a browser); imported only when the fallback runs
+        from crawl4ai import AsyncWebCrawler
+
+        logger.info("🕷️ Running crawl4ai...")
         async with AsyncWebCrawler() as crawler:
             result = await crawler.arun(url=url)
             return result.markdown if result else ""
@@ -396,23 +983,22 @@ class CitationExtractor:
                 "container-title": extract_publisher_from_domain(url),
             }
         except Exception as e:
-            logging.error(f"Error extracting media metadata: {e}")
+            logger.error("Error extracting media metadata: %s", e)
             return {}
 
-    def _analyze_pdf_structure(self, pdf_path: str) -> tuple:
-        """Analyze PDF structure using PyMuPDF."""
+    @staticmethod
+    def _analyze_pdf_structure(doc: fitz.Document) -> int:
+        """
+        Return the page count of an already opened document, or 0 on error.
+
+        The Info dictionary is only for the debug log, so it is decoded only
+        when debug output is enabled.
+        """
         try:
-            doc = fitz.open(pdf_path)
             num_pages = doc.page_count
-            filename = os.path.basename(pdf_path)
-
-            # Extract basic metadata
-            metadata = doc.metadata
-            logging.info(f"PDF metadata: {metadata}")
-
-            doc.close()
-            return num_pages, filename
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("PDF metadata: %s", doc.metadata or {})
+            return num_pages
         except Exception as e:
-            logging.error(f"Error analyzing PDF structure: {e}")
-            return 0, ""
-
+            logger.error("Error analyzing PDF structure: %s", e)
+            return 0
@@ -1,17 +1,49 @@
+from __future__ import annotations
+
 import dspy
 import logging
-from typing import Dict, Optional, List
-import fitz  # PyMuPDF
-from .llm import get_llm_model
+import math
+from typing import TYPE_CHECKING, Dict, Optional, List, Union
+from .llm import DEFAULT_LLM_MODEL, get_llm_model
+from .utils import extract_pdf_text, open_pdf, parse_page_range
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
 
 import re
 
+logger = logging.getLogger(__name__)
+
+# Lines that hold nothing but a page number or "Page N" running header
+PAGE_NUMBER_LINE_RE = re.compile(r"^(page\s+\d+|\d+)$", re.IGNORECASE)
+
+# Page number patterns ordered by priority - most specific first
+PAGE_NUMBER_PATTERNS = [
+    re.compile(p, re.IGNORECASE)
+    for p in [
+        r'第\s*(\d+)\s*[页頁][，,]\s*共\s*\d+\s*[页頁]',  # "第 1 頁，共 20 頁"
+        r'[·•∙・\-]\s*(\d+)\s*[·•∙・\-]',               # "·190·" or "•191•" - HIGH PRIORITY
+        r'第\s*(\d+)\s*[页頁]',                            # "第1页" or "第 1 頁" 
+        r'([1-9]\d*)\s*[页頁]',                           # "1页" or "123 頁"
+        r'[页頁]\s*([1-9]\d*)',                           # "页1" or "頁 123"
+        r'[pP]age\s+([1-9]\d*)',                         # "Page 123"
+        r'[pP]\.?\s*([1-9]\d*)',                         # "p. 123" or "P.123"
+        r'([1-9]\d*)ページ',                             # "123ページ"
+        r'[\[\(]([1-9]\d*)[\]\)]',                       # "[123]" or "(123)"
+        r'^([1-9]\d*)$',                                 # Pure number: "123" - LOWEST PRIORITY
+        r'^([ivxlcdmIVXLCDM]+)$',                        # Roman numerals
+    ]
+]
+
+# A bare folio in a page margin: "1" to "9999"
+FOLIO_RE = re.compile(r"^[1-9]\d{0,3}$")
+
+# Total page count: "共 20 頁"
+TOTAL_PAGES_RE = re.compile(r'共\s*(\d+)\s*[页頁]', re.IGNORECASE)
+
 class ImprovedPageNumberExtractor:
     """Enhanced page number extraction with pattern recognition and position consistency"""
     
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-    
     def extract_number_from_text(self, text: str) -> Optional[int]:
         """Extract page numbers using comprehensive patterns with priority order"""
         if not text:
@@ -26,23 +58,8 @@ class ImprovedPageNumberExtractor:
         if vertical_match is not None:
             return vertical_match
         
-        # Patterns ordered by priority - most specific first
-        patterns = [
-            r'第\s*(\d+)\s*[页頁][，,]\s*共\s*\d+\s*[页頁]',  # "第 1 頁，共 20 頁"
-            r'[·•∙・\-]\s*(\d+)\s*[·•∙・\-]',               # "·190·" or "•191•" - HIGH PRIORITY
-            r'第\s*(\d+)\s*[页頁]',                            # "第1页" or "第 1 頁" 
-            r'([1-9]\d*)\s*[页頁]',                           # "1页" or "123 頁"
-            r'[页頁]\s*([1-9]\d*)',                           # "页1" or "頁 123"
-            r'[pP]age\s+([1-9]\d*)',                         # "Page 123"
-            r'[pP]\.?\s*([1-9]\d*)',                         # "p. 123" or "P.123"
-            r'([1-9]\d*)ページ',                             # "123ページ"
-            r'[\[\(]([1-9]\d*)[\]\)]',                       # "[123]" or "(123)"
-            r'^([1-9]\d*)$',                                 # Pure number: "123" - LOWEST PRIORITY
-            r'^([ivxlcdmIVXLCDM]+)$',                        # Roman numerals
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in PAGE_NUMBER_PATTERNS:
+            match = pattern.search(text)
             if match:
                 try:
                     value = match.group(1)
@@ -75,13 +92,13 @@ class ImprovedPageNumberExtractor:
                     # This represents 14X format (141, 142, 143, etc.)
                     base_num = 140 + int(digits[0])  # 140 + 1 = 141, 140 + 2 = 142, etc.
                     if 100 <= base_num <= 999:
-                        self.logger.debug(f"Vertical academic format detected: {digits} -> {base_num}")
+                        logger.debug("Vertical academic format detected: %s -> %s", digits, base_num)
                         return base_num
                 elif digits[1] == '5' and digits[2] == '1':  # Pattern like X51 where X is the variable digit  
                     # This represents 15X format (151, 152, 153, etc.)
                     base_num = 150 + int(digits[0])  # 150 + 1 = 151, 150 + 2 = 152, etc.
                     if 100 <= base_num <= 999:
-                        self.logger.debug(f"Vertical academic format detected: {digits} -> {base_num}")
+                        logger.debug("Vertical academic format detected: %s -> %s", digits, base_num)
                         return base_num
                 else:
                     # Standard vertical format - combine digits directly
@@ -90,7 +107,7 @@ class ImprovedPageNumberExtractor:
                     
                     # Check if it's in a reasonable range (100-999 for academic papers)
                     if 100 <= page_num <= 999:
-                        self.logger.debug(f"Standard vertical format detected: {digits} -> {page_num}")
+                        logger.debug("Standard vertical format detected: %s -> %s", digits, page_num)
                         return page_num
             except ValueError:
                 pass
@@ -103,9 +120,7 @@ class ImprovedPageNumberExtractor:
         if not text:
             return None
         
-        # Pattern to extract total pages: "共 20 頁" 
-        total_pattern = r'共\s*(\d+)\s*[页頁]'
-        match = re.search(total_pattern, text, re.IGNORECASE)
+        match = TOTAL_PAGES_RE.search(text)
         if match:
             try:
                 total = int(match.group(1))
@@ -118,6 +133,8 @@ class ImprovedPageNumberExtractor:
 
     def extract_text_by_position(self, page, position_type="footer"):
         """Extract text from specific positions (header/footer)"""
+        import fitz  # PyMuPDF
+
         page_rect = page.rect
         page_height = page_rect.height
         page_width = page_rect.width
@@ -197,64 +214,69 @@ class ImprovedPageNumberExtractor:
         
         return position_texts
     
-    def find_continuous_page_sequence(self, pdf_path: str, max_pages: int = 5) -> Dict[int, int]:
-        """Find continuous page number sequences with consistent positioning"""
-        doc = fitz.open(pdf_path)
-        total_pages = min(doc.page_count, max_pages)
-        
-        # Collect all potential page numbers from each page
-        page_candidates = {}
-        
-        for page_idx in range(total_pages):
-            page = doc[page_idx]
-            candidates = []
-            
-            # Check both header and footer
-            for position_type in ["footer", "header"]:
-                position_texts = self.extract_text_by_position(page, position_type)
-                
-                for text_info in position_texts:
-                    page_num = self.extract_number_from_text(text_info["text"])
-                    if page_num is not None:
-                        candidates.append({
-                            "page_num": page_num,
-                            "position_type": position_type,
-                            "position": text_info["position"],
-                            "text": text_info["text"],
-                            "bbox": text_info["bbox"]
-                        })
-            
-            page_candidates[page_idx] = candidates
-        
-        doc.close()
-        
-        # Find the best continuous sequence with consistent positioning
-        best_sequence = self._find_best_sequence(page_candidates)
-        
-        return best_sequence
-    
+    def _folio_on_page(self, page) -> Optional[int]:
+        """
+        Find a bare page number in the top or bottom 10% of a page.
 
-    def find_continuous_page_sequence_with_range(self, pdf_path: str, page_range: str, total_pdf_pages: int) -> Dict[int, int]:
+        Only digit-only spans set no larger than the page's typical body font
+        count, which filters out headings, issue numbers and years in titles.
+        """
+        page_height = page.rect.height
+        spans = [
+            span
+            for block in page.get_text("dict")["blocks"]
+            for line in block.get("lines", [])
+            for span in line["spans"]
+            if span["text"].strip()
+        ]
+        if not spans:
+            return None
+
+        sizes = sorted(span["size"] for span in spans)
+        body_size = sizes[len(sizes) // 2]
+        for span in spans:
+            text = span["text"].strip()
+            y0, y1 = span["bbox"][1], span["bbox"][3]
+            in_margin = y1 <= page_height * 0.1 or y0 >= page_height * 0.9
+            if in_margin and FOLIO_RE.match(text) and span["size"] <= body_size:
+                return int(text)
+        return None
+
+    def guess_range_from_end_pages(self, doc) -> Optional[str]:
+        """
+        Guess 'start-end' from the folios of a document's first and last page.
+
+        A cheap local check for when no continuous sequence was found, e.g.
+        because the middle pages carry no number. The range must cover at
+        least the pages of the document.
+        """
+        page_count = doc.page_count
+        if page_count < 2:
+            return None
+        start = self._folio_on_page(doc.load_page(0))
+        end = self._folio_on_page(doc.load_page(page_count - 1))
+        if start is None or end is None or end - start + 1 < page_count:
+            return None
+        return f"{start}-{end}"
+
+    def find_continuous_page_sequence_with_range(
+        self, pdf: Union[str, fitz.Document], page_range: str, total_pdf_pages: int
+    ) -> Dict[int, int]:
         """
         Find continuous page number sequences respecting the page_range structure.
         
         Args:
-            pdf_path: Path to the PDF file
+            pdf: Path to the PDF file, or an already opened document
             page_range: Page range string (e.g., "1-5, -3")
             total_pdf_pages: Total number of pages in the PDF
             
         Returns:
             Dict mapping PDF page indices to actual page numbers
         """
-        from .utils import parse_page_range
-        
-        doc = fitz.open(pdf_path)
-        
         # Parse the page range into actual page indices
         pages_to_analyze = parse_page_range(page_range, total_pdf_pages)
         if not pages_to_analyze:
-            self.logger.warning(f"Invalid page range: {page_range}")
-            doc.close()
+            logger.warning("Invalid page range: %s", page_range)
             return {}
         
         # Separate first part and last part based on the original page range
@@ -295,14 +317,13 @@ class ImprovedPageNumberExtractor:
         first_part_pages = sorted(set(first_part_pages))
         last_part_pages = sorted(set(last_part_pages))
         
-        self.logger.info(f"First part pages (0-based): {first_part_pages}")
-        self.logger.info(f"Last part pages (0-based): {last_part_pages}")
+        logger.info("First part pages (0-based): %s", first_part_pages)
+        logger.info("Last part pages (0-based): %s", last_part_pages)
         
         # Extract page number candidates for each part
-        first_part_sequence = self._extract_sequence_from_pages(doc, first_part_pages) if first_part_pages else {}
-        last_part_sequence = self._extract_sequence_from_pages(doc, last_part_pages) if last_part_pages else {}
-        
-        doc.close()
+        with open_pdf(pdf) as doc:
+            first_part_sequence = self._extract_sequence_from_pages(doc, first_part_pages) if first_part_pages else {}
+            last_part_sequence = self._extract_sequence_from_pages(doc, last_part_pages) if last_part_pages else {}
         
         # Combine sequences using smart logic
         final_sequence = self._smart_combine_sequences(
@@ -319,27 +340,28 @@ class ImprovedPageNumberExtractor:
         
         # Try footer first, then header if footer doesn't work
         for position_type in ["footer", "header"]:
-            self.logger.debug(f"Trying position_type: {position_type}")
+            logger.debug("Trying position_type: %s", position_type)
             page_candidates = self._collect_candidates_by_position(doc, page_indices, position_type)
             
             if page_candidates:
                 sequence = self._find_best_sequence_for_part(page_candidates, position_type)
                 if sequence:
-                    self.logger.info(f"Found sequence in {position_type}: {sequence}")
+                    logger.info("Found sequence in %s: %s", position_type, sequence)
                     return sequence
         
-        self.logger.warning("No valid sequence found in footer or header")
+        logger.warning("No valid sequence found in footer or header")
         return {}
     
     def _collect_candidates_by_position(self, doc, page_indices: List[int], position_type: str) -> Dict[int, List[Dict]]:
         """Collect page number candidates for a specific position type"""
         page_candidates = {}
+        page_count = doc.page_count
         
         for page_idx in page_indices:
-            if page_idx >= doc.page_count:
+            if page_idx >= page_count:
                 continue
                 
-            page = doc[page_idx]
+            page = doc.load_page(page_idx)
             candidates = []
             
             position_texts = self.extract_text_by_position(page, position_type)
@@ -354,7 +376,7 @@ class ImprovedPageNumberExtractor:
                         "text": text_info["text"],
                         "bbox": text_info["bbox"]
                     })
-                    self.logger.debug(f"Page {page_idx}: found page_num {page_num} in {position_type} {text_info['position']}: '{text_info['text']}'")
+                    logger.debug("Page %s: found page_num %s in %s %s: '%s'", page_idx, page_num, position_type, text_info['position'], text_info['text'])
             
             if candidates:
                 page_candidates[page_idx] = candidates
@@ -387,7 +409,7 @@ class ImprovedPageNumberExtractor:
         best_score = -1
         best_combination = None
         
-        self.logger.debug(f"Testing {len(list(itertools.product(*non_empty_lists)))} combinations for {position_type}")
+        logger.debug("Testing %d combinations for %s", math.prod(len(c) for c in non_empty_lists), position_type)
         
         for combination in itertools.product(*non_empty_lists):
             # Check position consistency (alternating or center)
@@ -406,7 +428,8 @@ class ImprovedPageNumberExtractor:
             
             total_score = continuity_score + position_score
             
-            self.logger.debug(f"Combination {[c['page_num'] for c in combination]} ({pattern_type}): continuity={continuity_score:.1f}, position={position_score:.1f}, total={total_score:.1f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Combination %s (%s): continuity=%.1f, position=%.1f, total=%.1f", [c['page_num'] for c in combination], pattern_type, continuity_score, position_score, total_score)
             
             if total_score > best_score:
                 best_score = total_score
@@ -414,10 +437,10 @@ class ImprovedPageNumberExtractor:
                 best_combination = combination
         
         if best_sequence:
-            self.logger.info(f"Best sequence in {position_type}: {best_sequence} (score: {best_score:.1f})")
+            logger.info("Best sequence in %s: %s (score: %.1f)", position_type, best_sequence, best_score)
             if best_combination:
                 pattern_info = [(c['page_num'], c['position'], c['text']) for c in best_combination]
-                self.logger.debug(f"Best pattern: {pattern_info}")
+                logger.debug("Best pattern: %s", pattern_info)
         
         return best_sequence if best_sequence else {}
     
@@ -481,7 +504,7 @@ class ImprovedPageNumberExtractor:
         
         # Case 4: No sequences found
         else:
-            self.logger.warning("No continuous sequences found in either part")
+            logger.warning("No continuous sequences found in either part")
             return {}
     
     def _combine_both_sequences(
@@ -510,82 +533,32 @@ class ImprovedPageNumberExtractor:
         pdf_gap = last_first_pdf_page - first_last_pdf_page
         actual_gap = last_start - first_end
         
-        self.logger.info(f"Gap analysis - PDF gap: {pdf_gap}, Actual gap: {actual_gap}")
-        self.logger.info(f"First sequence: {first_start}-{first_end}, Last sequence: {last_start}-{last_end}")
+        logger.info("Gap analysis - PDF gap: %s, Actual gap: %s", pdf_gap, actual_gap)
+        logger.info("First sequence: %s-%s, Last sequence: %s-%s", first_start, first_end, last_start, last_end)
         
         # Smart combine: Check if sequences belong to the same document
         # For academic papers with page gaps, we need more flexible gap analysis
         
-        # Calculate the expected page progression based on PDF structure
-        first_pdf_pages = sorted([k for k in first_sequence.keys()])
-        last_pdf_pages = sorted([k for k in last_sequence.keys()])
-        
         # Check if there's a reasonable progression (not necessarily continuous)
         # Allow larger gaps for academic papers that might skip pages
         max_reasonable_gap = max(20, pdf_gap * 10)  # More flexible tolerance
         
         if actual_gap > 0 and actual_gap <= max_reasonable_gap:
             # Create combined sequence
-            self.logger.info(f"Smart combined sequences: {first_start} to {last_end} (gap acceptable for academic document)")
+            logger.info("Smart combined sequences: %s to %s (gap acceptable for academic document)", first_start, last_end)
             combined = first_sequence.copy()
             combined.update(last_sequence)
-            self.logger.debug(f"Combined sequence: {combined}")
+            logger.debug("Combined sequence: %s", combined)
             return combined
         elif last_sequence and len(last_sequence) >= len(first_sequence):
             # If last sequence is substantial and first sequence has issues, prefer last
-            self.logger.info(f"Using last sequence due to better coverage: {last_start} to {last_end}")
+            logger.info("Using last sequence due to better coverage: %s to %s", last_start, last_end)
             return last_sequence
         else:
             # Gap too large or negative, return first sequence as fallback
-            self.logger.warning(f"Gap not suitable for combination ({actual_gap}), using first sequence")
+            logger.warning("Gap not suitable for combination (%s), using first sequence", actual_gap)
             return first_sequence
 
-    def _find_best_sequence(self, page_candidates: Dict[int, List[Dict]]) -> Dict[int, int]:
-        """Find the best continuous sequence with consistent positioning"""
-        if len(page_candidates) < 2:
-            return {}
-        
-        import itertools
-        
-        # Generate all possible combinations
-        page_indices = sorted(page_candidates.keys())
-        candidate_lists = [page_candidates[page_idx] for page_idx in page_indices]
-        
-        # Filter out empty candidate lists
-        non_empty_indices = []
-        non_empty_lists = []
-        for i, candidates in enumerate(candidate_lists):
-            if candidates:
-                non_empty_indices.append(page_indices[i])
-                non_empty_lists.append(candidates)
-        
-        if len(non_empty_lists) < 2:
-            return {}
-        
-        best_sequence = None
-        best_score = -1
-        
-        for combination in itertools.product(*non_empty_lists):
-            # Check position consistency
-            if not self._check_position_consistency(combination):
-                continue
-            
-            # Check numerical continuity
-            sequence = {}
-            for i, candidate in enumerate(combination):
-                sequence[non_empty_indices[i]] = candidate["page_num"]
-            
-            continuity_score = self._score_continuity(sequence)
-            position_score = self._score_position_consistency(combination)
-            
-            total_score = continuity_score + position_score
-            
-            if total_score > best_score:
-                best_score = total_score
-                best_sequence = sequence
-        
-        return best_sequence if best_sequence else {}
-    
     def _deduce_missing_pages(self, sequence: Dict[int, int], last_pages: List[int], total_pdf_pages: int) -> Dict[int, int]:
         """Deduce missing page numbers for pages without explicit numbers"""
         if not sequence:
@@ -604,7 +577,7 @@ class ImprovedPageNumberExtractor:
                 last_known_pdf_page = max(candidates_in_last, key=lambda x: x[0])[0]
                 last_known_page_num = sequence[last_known_pdf_page]
                 
-                self.logger.debug(f"Last known: PDF page {last_known_pdf_page+1} = page number {last_known_page_num}")
+                logger.debug("Last known: PDF page %d = page number %d", last_known_pdf_page + 1, last_known_page_num)
                 
                 # Deduce for all pages after the last known page up to the end of last_pages
                 max_last_page = max(last_pages)
@@ -614,20 +587,10 @@ class ImprovedPageNumberExtractor:
                         # Deduce the page number by adding the difference
                         deduced_page_num = last_known_page_num + (pdf_page_idx - last_known_pdf_page)
                         enhanced_sequence[pdf_page_idx] = deduced_page_num
-                        self.logger.info(f"Deduced: PDF page {pdf_page_idx+1} = page number {deduced_page_num}")
+                        logger.info("Deduced: PDF page %s = page number %s", pdf_page_idx+1, deduced_page_num)
         
         return enhanced_sequence
     
-    def _check_position_consistency(self, combination: List[Dict]) -> bool:
-        """Legacy position consistency check for backward compatibility"""
-        position_consistent, _ = self._check_enhanced_position_consistency(combination)
-        return position_consistent
-    
-    def _score_position_consistency(self, combination: List[Dict]) -> float:
-        """Legacy position scoring for backward compatibility"""
-        _, pattern_type = self._check_enhanced_position_consistency(combination)
-        return self._score_enhanced_position_consistency(combination, pattern_type)
-    
     def _check_enhanced_position_consistency(self, combination: List[Dict]) -> tuple[bool, str]:
         """Check if page numbers appear in consistent patterns (alternating or center)"""
         if len(combination) < 2:
@@ -638,21 +601,21 @@ class ImprovedPageNumberExtractor:
         
         # Check for center pattern first (higher priority for decorative symbols)
         if all(pos == "center" for pos in positions):
-            self.logger.debug(f"Center pattern found: {list(zip(page_nums, positions))}")
+            logger.debug("Center pattern found: pages=%s positions=%s", page_nums, positions)
             return True, "center"
         
         # Check for alternating pattern based on actual page numbers (odd/even)
         if self._is_valid_alternating_pattern(combination):
-            self.logger.debug(f"Alternating pattern found: {list(zip(page_nums, positions))}")
+            logger.debug("Alternating pattern found: pages=%s positions=%s", page_nums, positions)
             return True, "alternating"
         
         # Check for consistent single position (all left or all right)
         unique_positions = set(positions)
         if len(unique_positions) == 1 and list(unique_positions)[0] in ["left", "right"]:
-            self.logger.debug(f"Consistent {positions[0]} pattern found: {list(zip(page_nums, positions))}")
+            logger.debug("Consistent %s pattern found: pages=%s positions=%s", positions[0], page_nums, positions)
             return True, f"consistent_{positions[0]}"
         
-        self.logger.debug(f"No consistent pattern found: {list(zip(page_nums, positions))}")
+        logger.debug("No consistent pattern found: pages=%s positions=%s", page_nums, positions)
         return False, "none"
     
     def _is_valid_alternating_pattern(self, combination: List[Dict]) -> bool:
@@ -674,33 +637,6 @@ class ImprovedPageNumberExtractor:
         
         return True
     
-    def _score_continuity(self, sequence: Dict[int, int]) -> float:
-        """Score sequence based on numerical continuity (Rule 1)"""
-        if len(sequence) < 2:
-            return 0
-        
-        sorted_items = sorted(sequence.items())
-        continuity_score = 0
-        
-        for i in range(len(sorted_items) - 1):
-            page_idx1, page_num1 = sorted_items[i]
-            page_idx2, page_num2 = sorted_items[i + 1]
-            
-            expected_diff = page_idx2 - page_idx1
-            actual_diff = page_num2 - page_num1
-            
-            # Perfect continuity: numbers increase by 1 for consecutive pages
-            if actual_diff == expected_diff and actual_diff > 0:
-                continuity_score += 100
-            elif actual_diff == 1:  # Sequential pages
-                continuity_score += 90
-            elif abs(actual_diff - expected_diff) <= 1:  # Close match
-                continuity_score += 50
-            else:
-                continuity_score -= 30  # Penalty for poor continuity
-        
-        return continuity_score / (len(sorted_items) - 1) if len(sorted_items) > 1 else 0
-    
     def _score_enhanced_position_consistency(self, combination: List[Dict], pattern_type: str) -> float:
         """Score position consistency based on detected pattern type"""
         if len(combination) < 1:
@@ -720,19 +656,74 @@ class ImprovedPageNumberExtractor:
 
 
 
+# Longest text, in characters, sent to the LLM per document type. Books and
+# theses keep 6000 characters from the front (title, copyright and contents
+# pages) and 2000 from the back (colophon); a single article or chapter page
+# rarely needs more than 4000.
+MAX_PROMPT_CHARS = {
+    "book": 8000,
+    "thesis": 8000,
+    "journal": 4000,
+    "bookchapter": 4000,
+}
+
+
 class CitationLLM:
     """LLM handler for citation extraction using DSPy."""
 
-    def __init__(self, llm_model="ollama/qwen3"):
-        """Initialize the LLM."""
-        self.llm = get_llm_model(llm_model, temperature=0.1)
+    # Share of the token budget kept from the start of a long text; the rest is
+    # taken from its end, where colophons and journal references usually sit.
+    head_ratio = 0.75
+
+    def __init__(self, llm_model=DEFAULT_LLM_MODEL, enable_cache: bool = True):
+        """
+        Initialize the LLM.
+
+        Args:
+            llm_model: Model name in "provider/model" format.
+            enable_cache: Reuse cached responses for repeated prompts. Disable
+                for deterministic tests that must hit the model.
+        """
+        self.llm = get_llm_model(llm_model, temperature=0.1, cache=enable_cache)
         dspy.settings.configure(lm=self.llm)
 
-    def _truncate_text(self, text: str, max_tokens: int = 2048) -> str:
-        """Truncate text to a maximum number of tokens."""
+    def _truncate_text(
+        self,
+        text: str,
+        max_tokens: int = 2048,
+        drop_page_numbers: bool = False,
+        max_chars: Optional[int] = None,
+    ) -> str:
+        """
+        Shrink text before it is sent to the LLM.
+
+        Blank lines (and, optionally, bare page-number lines) are dropped, and
+        text over the token budget keeps its head and tail instead of only
+        its first tokens. The token count is by whitespace, which barely
+        limits CJK text, so `max_chars` caps the length the same way.
+        """
+        original_length = len(text)
+        lines = [line.strip() for line in text.splitlines()]
+        lines = [
+            line
+            for line in lines
+            if line and not (drop_page_numbers and PAGE_NUMBER_LINE_RE.match(line))
+        ]
+        text = "\n".join(lines)
+
         tokens = text.split()
         if len(tokens) > max_tokens:
-            return " ".join(tokens[:max_tokens])
+            head = int(max_tokens * self.head_ratio)
+            tail = max_tokens - head
+            text = " ".join(tokens[:head] + ["..."] + tokens[-tail:])
+
+        if max_chars and len(text) > max_chars:
+            head = int(max_chars * self.head_ratio)
+            text = text[:head] + "\n...\n" + text[head - max_chars :]
+
+        logger.debug(
+            "Truncated LLM input from %d to %d characters", original_length, len(text)
+        )
         return text
 
     def extract_book_citation(self, pdf_text: str) -> Dict:
@@ -755,11 +746,11 @@ class CitationLLM:
                 if value and value.strip() and value.strip().lower() != "unknown":
                     citation_info[key] = value.strip()
 
-            logging.info(f"Book LLM extraction result: {citation_info}")
+            logger.info("Book LLM extraction result: %s", citation_info)
             return citation_info
 
         except Exception as e:
-            logging.error(f"Error with book LLM extraction: {e}")
+            logger.error("Error with book LLM extraction: %s", e)
             return {}
 
     def extract_thesis_citation(self, pdf_text: str) -> Dict:
@@ -782,11 +773,11 @@ class CitationLLM:
                 if value and value.strip() and value.strip().lower() != "unknown":
                     citation_info[key] = value.strip()
 
-            logging.info(f"Thesis LLM extraction result: {citation_info}")
+            logger.info("Thesis LLM extraction result: %s", citation_info)
             return citation_info
 
         except Exception as e:
-            logging.error(f"Error with thesis LLM extraction: {e}")
+            logger.error("Error with thesis LLM extraction: %s", e)
             return {}
 
     def extract_journal_citation(self, pdf_text: str) -> Dict:
@@ -814,11 +805,11 @@ class CitationLLM:
                     else:
                         citation_info[key] = value.strip()
 
-            logging.info(f"Journal LLM extraction result: {citation_info}")
+            logger.info("Journal LLM extraction result: %s", citation_info)
             return citation_info
 
         except Exception as e:
-            logging.error(f"Error with journal LLM extraction: {e}")
+            logger.error("Error with journal LLM extraction: %s", e)
             return {}
 
     def extract_bookchapter_citation(self, pdf_text: str) -> Dict:
@@ -852,134 +843,221 @@ class CitationLLM:
                     else:
                         citation_info[key] = value.strip()
 
-            logging.info(f"Book chapter LLM extraction result: {citation_info}")
+            logger.info("Book chapter LLM extraction result: %s", citation_info)
             return citation_info
 
         except Exception as e:
-            logging.error(f"Error with book chapter LLM extraction: {e}")
+            logger.error("Error with book chapter LLM extraction: %s", e)
             return {}
 
     def extract_page_numbers_for_journal_chapter(
         self,
-        pdf_path: str,
-        page_range: str = "1-5, -3"
+        pdf: Union[str, fitz.Document],
+        page_range: str = "1-5, -3",
+        use_llm: bool = True,
     ) -> Dict:
         """
         Enhanced page number extraction using pattern recognition and position consistency.
         
         Args:
-            pdf_path: Path to the PDF file
+            pdf: Path to the PDF file, or an already opened document that is
+                reused for every pass instead of being re-parsed
             page_range: Page range to analyze (e.g., "1-5, -3")
+            use_llm: Ask the LLM when no page sequence is found. Callers that
+                use extract_combined already get the LLM's page range there.
         
         Returns:
             Dict with page_numbers field if found
         """
         try:
-            # Step 1: Try advanced pattern-based extraction first
-            extractor = ImprovedPageNumberExtractor()
-            
-            # Use the enhanced pattern recognition with max 5 pages for now
-            # TODO: Implement full page-range awareness as discussed
-            # Get PDF page count for page-range aware extraction
-            doc_temp = fitz.open(pdf_path)
-            total_pdf_pages = doc_temp.page_count
-            doc_temp.close()
-            
-            # Use page-range aware extraction
-            page_sequence = extractor.find_continuous_page_sequence_with_range(
-                pdf_path, page_range, total_pdf_pages
-            )
+            with open_pdf(pdf) as doc:
+                return self._extract_page_numbers_for_journal_chapter(
+                    doc, page_range, use_llm
+                )
+        except Exception as e:
+            logger.error("Error with page number extraction: %s", e)
+            return {}
+
+    def _extract_page_numbers_for_journal_chapter(
+        self, doc: fitz.Document, page_range: str, use_llm: bool = True
+    ) -> Dict:
+        # Step 1: Try advanced pattern-based extraction first
+        extractor = ImprovedPageNumberExtractor()
+        page_count = doc.page_count
+
+        # TODO: Implement full page-range awareness as discussed
+        # Use page-range aware extraction
+        page_sequence = extractor.find_continuous_page_sequence_with_range(
+            doc, page_range, page_count
+        )
+        
+        if page_sequence:
+            # Convert to page range format
+            page_numbers = list(page_sequence.values())
+            start_page = min(page_numbers)
             
-            if page_sequence:
-                # Convert to page range format
-                page_numbers = list(page_sequence.values())
-                start_page = min(page_numbers)
-                
-                # Try to extract total page count from any page text
-                doc = fitz.open(pdf_path)
-                total_pages = None
-                for i in range(min(3, doc.page_count)):  # Check first 3 pages for total
-                    page = doc[i]
-                    for position_type in ["header", "footer"]:
-                        position_texts = extractor.extract_text_by_position(page, position_type)
-                        for text_info in position_texts:
-                            total = extractor.extract_total_pages_from_text(text_info["text"])
-                            if total:
-                                total_pages = total
-                                break
-                        if total_pages:
+            # Try to extract total page count from any page text
+            total_pages = None
+            for i in range(min(3, page_count)):  # Check first 3 pages for total
+                page = doc.load_page(i)
+                for position_type in ["header", "footer"]:
+                    position_texts = extractor.extract_text_by_position(page, position_type)
+                    for text_info in position_texts:
+                        total = extractor.extract_total_pages_from_text(text_info["text"])
+                        if total:
+                            total_pages = total
                             break
                     if total_pages:
                         break
-                doc.close()
-                
-                if total_pages and total_pages > start_page:
-                    # Use the full document range
-                    page_result = f"{start_page}-{total_pages}"
-                    logging.info(f"Pattern-based page extraction found full range: {page_result} (from 共 {total_pages} 頁)")
-                    return {"page_numbers": page_result}
-                elif len(page_numbers) >= 2:
-                    # Fallback to detected range
-                    end_page = max(page_numbers)
-                    page_result = f"{start_page}-{end_page}"
-                    logging.info(f"Pattern-based page extraction found sample range: {page_result}")
-                    return {"page_numbers": page_result}
-                elif len(page_numbers) == 1:
-                    # Single page
-                    page_result = str(page_numbers[0])
-                    logging.info(f"Pattern-based page extraction found single page: {page_result}")
-                    return {"page_numbers": page_result}
-            
-            logging.info("Pattern-based extraction found no continuous sequence, falling back to LLM")
-            
-            # Step 2: Fallback to LLM-based method if pattern-based fails
-            doc = fitz.open(pdf_path)
-            if doc.page_count == 0:
-                doc.close()
-                return {}
-            
-            # Extract text from strategic pages for LLM analysis
-            first_page_text = doc[0].get_text() if doc.page_count > 0 else ""
-            second_page_text = doc[1].get_text() if doc.page_count > 1 else ""
-            last_page_text = doc[doc.page_count - 1].get_text() if doc.page_count > 0 else ""
-            second_to_last_page_text = doc[doc.page_count - 2].get_text() if doc.page_count > 1 else ""
-            
-            doc.close()
+                if total_pages:
+                    break
             
+            if total_pages and total_pages > start_page:
+                # Use the full document range
+                page_result = f"{start_page}-{total_pages}"
+                logger.info("Pattern-based page extraction found full range: %s (from 共 %s 頁)", page_result, total_pages)
+                return {"page_numbers": page_result}
+            elif len(page_numbers) >= 2:
+                # Fallback to detected range
+                end_page = max(page_numbers)
+                page_result = f"{start_page}-{end_page}"
+                logger.info("Pattern-based page extraction found sample range: %s", page_result)
+                return {"page_numbers": page_result}
+            elif len(page_numbers) == 1:
+                # Single page
+                page_result = str(page_numbers[0])
+                logger.info("Pattern-based page extraction found single page: %s", page_result)
+                return {"page_numbers": page_result}
+        
+        # Step 2: Folios on the first and last page alone, still without the LLM
+        end_page_range = extractor.guess_range_from_end_pages(doc)
+        if end_page_range:
+            logger.info("Page range from first/last page folios: %s", end_page_range)
+            return {"page_numbers": end_page_range}
+
+        if not use_llm:
+            logger.info("Pattern-based extraction found no continuous sequence")
+            return {}
+
+        logger.info("Pattern-based extraction found no continuous sequence, falling back to LLM")
+        
+        # Step 3: Fallback to LLM-based method if pattern-based fails
+        if page_count == 0:
+            return {}
+        
+        # Extract text from strategic pages for LLM analysis
+        first_page_text = extract_pdf_text(doc, 0)
+        second_page_text = extract_pdf_text(doc, 1) if page_count > 1 else ""
+        last_page_text = extract_pdf_text(doc, page_count - 1)
+        second_to_last_page_text = extract_pdf_text(doc, page_count - 2) if page_count > 1 else ""
+        
+        signature = dspy.Signature(
+            "first_page_text, second_page_text, last_page_text, second_to_last_page_text -> page_numbers",
+            "Determine the page range (e.g., '20-41') for a document. "
+            "1. Look for a number in the header or footer of the 'first_page_text'. This is the starting page. "
+            "2. If not found, look for a number in the header or footer of the 'second_page_text'. If found, the starting page is that number minus 1. "
+            "3. Look for a number in the header or footer of the 'last_page_text'. This is the ending page. "
+            "4. If not found, look for a number in the header or footer of the 'second_to_last_page_text'. If found, the ending page is that number plus 1. "
+            "If you can determine both a start and end page, return them as 'start-end'. Otherwise, return 'Unknown'.",
+        )
+
+        predictor = dspy.Predict(signature)
+        result = predictor(
+            first_page_text=first_page_text,
+            second_page_text=second_page_text,
+            last_page_text=last_page_text,
+            second_to_last_page_text=second_to_last_page_text,
+        )
+
+        citation_info = {}
+        if result.page_numbers and result.page_numbers.lower() != "unknown":
+            citation_info["page_numbers"] = result.page_numbers.strip()
+            logger.info("LLM fallback page extraction result: %s", citation_info)
+        else:
+            logger.warning("LLM fallback also failed to extract page numbers")
+
+        return citation_info
+
+    def extract_combined(
+        self,
+        first_page_text: str,
+        second_page_text: str,
+        last_page_text: str,
+        second_to_last_page_text: str,
+        doc_type: str,
+    ) -> Dict:
+        """
+        Extract a journal article's or book chapter's fields and its page range in one call.
+
+        This replaces the separate LLM page-number fallback and the first
+        per-page prompt, which would otherwise both send the first page.
+        """
+        try:
+            if doc_type == "journal":
+                fields = "title, author, container_title, year, volume, issue, page_numbers, isbn, doi"
+                instructions = (
+                    "Extract citation information for a journal article. Look for title in the first page "
+                    "with biggest font size, author usually right under the title. Find journal name "
+                    "(as container_title), year, volume, and issue number in header or footer of the first page. "
+                )
+            else:
+                fields = "title, author, container_title, editor, publisher, year, location, page_numbers, isbn, doi"
+                instructions = (
+                    "Extract citation information for a book chapter. title and author are those of the chapter; "
+                    "container_title is the title of the book that contains it; editor is often found near "
+                    "'edited by'; publisher and year are those of the book. "
+                )
+
             signature = dspy.Signature(
-                "first_page_text, second_page_text, last_page_text, second_to_last_page_text -> page_numbers",
-                "Determine the page range (e.g., '20-41') for a document. "
-                "1. Look for a number in the header or footer of the 'first_page_text'. This is the starting page. "
-                "2. If not found, look for a number in the header or footer of the 'second_page_text'. If found, the starting page is that number minus 1. "
-                "3. Look for a number in the header or footer of the 'last_page_text'. This is the ending page. "
-                "4. If not found, look for a number in the header or footer of the 'second_to_last_page_text'. If found, the ending page is that number plus 1. "
-                "If you can determine both a start and end page, return them as 'start-end'. Otherwise, return 'Unknown'.",
+                f"first_page_text, second_page_text, last_page_text, second_to_last_page_text -> {fields}",
+                instructions
+                + "Determine page_numbers as 'start-end' (e.g., '20-41'): the start is the number in the header "
+                "or footer of 'first_page_text' (or that of 'second_page_text' minus 1), the end is the number in "
+                "the header or footer of 'last_page_text' (or that of 'second_to_last_page_text' plus 1). "
+                "For Chinese text, extract information similarly. Return 'Unknown' for missing fields.",
             )
 
+            max_chars = MAX_PROMPT_CHARS.get(doc_type)
             predictor = dspy.Predict(signature)
             result = predictor(
-                first_page_text=first_page_text,
-                second_page_text=second_page_text,
-                last_page_text=last_page_text,
-                second_to_last_page_text=second_to_last_page_text,
+                first_page_text=self._truncate_text(first_page_text, max_chars=max_chars),
+                second_page_text=self._truncate_text(second_page_text, max_chars=max_chars),
+                last_page_text=self._truncate_text(last_page_text, max_chars=max_chars),
+                second_to_last_page_text=self._truncate_text(
+                    second_to_last_page_text, max_chars=max_chars
+                ),
             )
 
             citation_info = {}
-            if result.page_numbers and result.page_numbers.lower() != "unknown":
-                citation_info["page_numbers"] = result.page_numbers.strip()
-                logging.info(f"LLM fallback page extraction result: {citation_info}")
-            else:
-                logging.warning("LLM fallback also failed to extract page numbers")
+            for key, value in result.items():
+                if value and value.strip() and value.strip().lower() != "unknown":
+                    # Convert container_title back to container-title for compatibility
+                    if key == "container_title":
+                        citation_info["container-title"] = value.strip()
+                    else:
+                        citation_info[key] = value.strip()
 
+            logger.info("Combined %s LLM extraction result: %s", doc_type, citation_info)
             return citation_info
 
         except Exception as e:
-            logging.error(f"Error with page number extraction: {e}")
+            logger.error("Error with combined %s LLM extraction: %s", doc_type, e)
             return {}
 
-    def extract_citation_from_text(self, text: str, doc_type: str) -> Dict:
-        """Extract citation based on document type after truncating long text."""
-        truncated_text = self._truncate_text(text)
+    def extract_citation_from_text(
+        self, text: str, doc_type: str, max_chars: Optional[int] = None
+    ) -> Dict:
+        """
+        Extract citation based on document type after truncating long text.
+
+        `max_chars` defaults to the document type's entry in MAX_PROMPT_CHARS.
+        """
+        # Page numbers only matter for the page range of articles and chapters
+        truncated_text = self._truncate_text(
+            text,
+            drop_page_numbers=doc_type in ("book", "thesis"),
+            max_chars=max_chars or MAX_PROMPT_CHARS.get(doc_type),
+        )
 
         if doc_type == "book":
             return self.extract_book_citation(truncated_text)
@@ -991,7 +1069,7 @@ class CitationLLM:
             return self.extract_bookchapter_citation(truncated_text)
         else:
             # Default fallback
-            logging.warning(f"Unknown document type: {doc_type}, using book extraction")
+            logger.warning("Unknown document type: %s, using book extraction", doc_type)
             return self.extract_book_citation(truncated_text)
 
     def extract_citation_from_web_markdown(self, markdown_text: str) -> Dict:
@@ -1014,11 +1092,11 @@ class CitationLLM:
                 if value and value.strip() and value.strip().lower() != "unknown":
                     citation_info[key] = value.strip()
 
-            logging.info(f"LLM extraction from web markdown result: {citation_info}")
+            logger.info("LLM extraction from web markdown result: %s", citation_info)
             return citation_info
 
         except Exception as e:
-            logging.error(f"Error with web markdown LLM extraction: {e}")
+            logger.error("Error with web markdown LLM extraction: %s", e)
             return {}
 
     def parse_search_results(self, search_response: str) -> Dict:
@@ -1044,8 +1122,8 @@ class CitationLLM:
                     else:
                         parsed_info[key] = value.strip()
 
-            logging.info(f"Parsed search results: {parsed_info}")
+            logger.info("Parsed search results: %s", parsed_info)
             return parsed_info
         except Exception as e:
-            logging.error(f"Error parsing search results with LLM: {e}")
+            logger.error("Error parsing search results with LLM: %s", e)
             return {}
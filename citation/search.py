@@ -1,8 +1,91 @@
+from __future__ import annotations
+
 import requests
 import logging
-from typing import Dict, Optional
+from difflib import SequenceMatcher
+from typing import TYPE_CHECKING, Dict, Optional
+
+from . import cache
+from .utils import http_session
+
+if TYPE_CHECKING:
+    from .model import CitationLLM
+
+logger = logging.getLogger(__name__)
+
+CROSSREF_WORKS_URL = "https://api.crossref.org/works"
+
+# Web search answers change as the index does, so they are reused for a day
+WEB_SEARCH_CACHE_TTL = 24 * 60 * 60
+# A title CrossRef does not know may be deposited later
+CROSSREF_MISS_TTL = 24 * 60 * 60
+
 
-from .model import CitationLLM
+def _normalize_title(title: str) -> str:
+    return " ".join(title.casefold().split())
+
+
+def _crossref_names(people: list) -> str:
+    return ", ".join(
+        " ".join(p for p in (person.get("given"), person.get("family")) if p)
+        for person in people
+    )
+
+
+def search_crossref(title: str, author: Optional[str] = None) -> Dict:
+    """
+    Look up a publication on the CrossRef REST API.
+
+    One HTTP request instead of a search-engine query plus LLM parsing. Only
+    accepts the top hit if its title closely matches. Matches are cached on
+    disk by normalized title and author, misses for CROSSREF_MISS_TTL
+    seconds; failed requests are not cached.
+
+    Returns:
+        The same fields as CitationLLM.parse_search_results, or {} if nothing
+        matched.
+    """
+    normalized = _normalize_title(title)
+    key = cache.make_key(normalized, author or "")
+    cached = cache.load_result(key, namespace="crossref")
+    if cached:
+        return cached
+    if cache.load_result(key, "crossref_miss", max_age=CROSSREF_MISS_TTL) is not None:
+        return {}
+
+    params = {"query.bibliographic": title, "rows": 1}
+    if author:
+        params["query.author"] = author
+    try:
+        response = http_session.get(CROSSREF_WORKS_URL, params=params, timeout=15)
+        response.raise_for_status()
+        items = response.json().get("message", {}).get("items", [])
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning("CrossRef lookup failed: %s", e)
+        return {}
+
+    found = {}
+    item = items[0] if items else {}
+    item_title = _normalize_title(" ".join(item.get("title", [])))
+    if item_title and SequenceMatcher(None, normalized, item_title).ratio() >= 0.9:
+        date_parts = (item.get("issued") or {}).get("date-parts") or [[None]]
+        fields = {
+            "container-title": " ".join(item.get("container-title", [])),
+            "editor": _crossref_names(item.get("editor", [])),
+            "publisher": item.get("publisher"),
+            "year": date_parts[0][0],
+            "volume": item.get("volume"),
+            "issue": item.get("issue"),
+            "page_numbers": item.get("page"),
+            "doi": item.get("DOI"),
+        }
+        found = {k: str(v) for k, v in fields.items() if v}
+        logger.info("CrossRef match for '%s': %s", title, found)
+    else:
+        logger.info("No close CrossRef match for '%s'", title)
+
+    cache.save_result(key, found, namespace="crossref" if found else "crossref_miss")
+    return found
 
 
 def search_for_missing_info(
@@ -15,7 +98,10 @@ def search_for_missing_info(
     page: Optional[str] = None,
 ) -> Optional[Dict]:
     """
-    Search for missing citation information using the local perpexica API and parse the result.
+    Search for missing citation information.
+
+    CrossRef is tried first; the local perpexica API (parsed by the LLM) is
+    only queried when CrossRef has no close match.
 
     Args:
         title: The title of the document.
@@ -30,9 +116,13 @@ def search_for_missing_info(
         A dictionary with the found citation information or None if an error occurs.
     """
     if not title or not author:
-        logging.warning("Title or author is missing, cannot perform search.")
+        logger.warning("Title or author is missing, cannot perform search.")
         return None
 
+    crossref_info = search_crossref(title, author)
+    if crossref_info:
+        return crossref_info
+
     search_url = "http://localhost:3000/api/search"
 
     # Build a detailed query with the information we already have
@@ -52,6 +142,12 @@ def search_for_missing_info(
         f"What is the book title and book editor for a publication with the following details: {known_info}. "
     )
 
+    key = cache.make_key(query)
+    cached = cache.load_result(key, namespace="websearch", max_age=WEB_SEARCH_CACHE_TTL)
+    if cached:
+        logger.info("Using cached search answer for: %s", title)
+        return cached
+
     payload = {
         "query": query,
         # webSearch, academicSearch, writingAssistant, wolframAlphaSearch, youtubeSearch, redditSearch
@@ -61,32 +157,33 @@ def search_for_missing_info(
     }
 
     try:
-        logging.info(f"Searching for missing info with query: {query}")
-        response = requests.post(search_url, json=payload, timeout=1800)
+        logger.info("Searching for missing info with query: %s", query)
+        response = http_session.post(search_url, json=payload, timeout=1800)
         response.raise_for_status()
 
         api_response = response.json()
 
         if "message" in api_response and api_response["message"]:
-            logging.info(
+            logger.info(
                 "Received response from search API. Parsing with LLM...")
             # Use the LLM to parse the natural language response
             parsed_info = llm.parse_search_results(api_response["message"])
+            if parsed_info:
+                cache.save_result(key, parsed_info, namespace="websearch")
             return parsed_info
         else:
-            logging.warning(
+            logger.warning(
                 "API response did not contain a 'message' field or it was empty."
             )
             return None
 
     except requests.exceptions.RequestException as e:
         # Handle connection errors, timeouts, etc.
-        logging.error(
-            f"Could not connect to perpexica API at {
-                search_url
-            }. Please ensure it is running. Error: {e}"
+        logger.error(
+            "Could not connect to perpexica API at %s. Please ensure it is running. Error: %s",
+            search_url, e
         )
         return None
     except Exception as e:
-        logging.error(f"An unexpected error occurred during search: {e}")
+        logger.error("An unexpected error occurred during search: %s", e)
         return None
@@ -1,119 +1,152 @@
+from __future__ import annotations
+
 import logging
 import re
-from typing import Tuple, Optional
-
-import fitz  # PyMuPDF
-
-
-def is_thesis(pdf_path: str) -> bool:
+from typing import TYPE_CHECKING, Union
+from .utils import open_pdf
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# Keywords to identify a thesis, including common English and Chinese terms.
+# \b ensures we match whole words
+THESIS_KEYWORD_RE = re.compile(
+    r'\b(thesis|dissertation|phd|master|论文|博士|硕士)\b', re.IGNORECASE
+)
+VOLUME_RE = re.compile(r'\b(volume|vol\.)\b|第\s*\d+\s*卷')
+ISSUE_RE = re.compile(r'\b(issue|no\.)\b|第\s*\d+\s*期')
+
+# Knockout keywords for articles and chapters, matched as plain substrings
+# of the lower-cased text in one scan each
+JOURNAL_KEYWORD_RE = re.compile(
+    "|".join(
+        map(
+            re.escape,
+            [
+                'issn', 'journal', 'proceedings', 'zeitschrift', 'revue',
+                '学报', '學報', '期刊', '雑誌', '紀要',  # S. Chinese, T. Chinese, Japanese
+            ],
+        )
+    )
+)
+CHAPTER_KEYWORD_RE = re.compile(
+    "|".join(
+        map(
+            re.escape,
+            [
+                'edited by', 'editor', 'isbn', 'press', 'herausgeber', 'éditeur',
+                '主编', '主編', '出版社', '編者', 'プレス',  # S. Chinese, T. Chinese, Japanese
+            ],
+        )
+    )
+)
+
+
+def _article_or_chapter_text(doc: fitz.Document):
+    """Lower-cased text used to tell articles from chapters, or None if empty."""
+    import fitz  # PyMuPDF
+
+    page_count = doc.page_count
+    if page_count == 0:
+        return None
+
+    # Analyze text from header, footer, and full first page for efficiency
+    parts = []
+    for i in range(min(page_count, 5)): # Check first 5 pages
+        page = doc.load_page(i)
+        if i == 0: # Get full text of first page
+            parts.append(page.get_text())
+        else: # Get only header/footer for other pages
+            rect = page.rect
+            header_rect = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * 0.15)
+            footer_rect = fitz.Rect(rect.x0, rect.y1 - rect.height * 0.15, rect.x1, rect.y1)
+            parts.append(page.get_text(clip=header_rect))
+            parts.append(page.get_text(clip=footer_rect))
+    # Lower-cased once for all the rules
+    return "\n".join(parts).lower() + "\n"
+
+
+def is_thesis(pdf: Union[str, fitz.Document]) -> bool:
     """
     Check if the document is a thesis by searching for keywords in the text
     of the pages specified by the page range.
-    """
-    # Keywords to identify a thesis, including common English and Chinese terms
-    thesis_keywords = [
-        'thesis', 'dissertation', 'phd', 'master',
-        '论文', '博士', '硕士'
-    ]
-    # Compile a single regex for case-insensitive matching
-    # \b ensures we match whole words
-    keyword_regex = re.compile(r'\b(' + '|'.join(thesis_keywords) + r')\b', re.IGNORECASE)
 
+    `pdf` is a path or an already opened document, which is left open.
+    """
     try:
-        doc = fitz.open(pdf_path)
-        # Iterate through all pages of the (subset) PDF
-        for page in doc:
-            text = page.get_text("text")
-            if keyword_regex.search(text):
-                logging.info(f"Thesis keyword found on page {page.number + 1}.")
-                doc.close()
-                return True
-        doc.close()
+        with open_pdf(pdf) as doc:
+            # Iterate through all pages of the (subset) PDF
+            for page in doc:
+                text = page.get_text("text")
+                if THESIS_KEYWORD_RE.search(text):
+                    logger.info("Thesis keyword found on page %s.", page.number + 1)
+                    return True
     except Exception as e:
-        logging.error(f"Error checking for thesis keywords in {pdf_path}: {e}")
+        logger.error("Error checking for thesis keywords in %s: %s", pdf, e)
     
     return False
 
 
-def differentiate_article_or_chapter(pdf_path: str) -> str:
+def differentiate_article_or_chapter(pdf: Union[str, fitz.Document]) -> str:
     """
     Differentiates between a journal article and a book chapter using a clear, rule-based hierarchy.
     Defaults to 'journal' if no definitive indicators are found.
+
+    `pdf` is a path or an already opened document, which is left open.
     """
     try:
-        doc = fitz.open(pdf_path)
-        if doc.page_count == 0:
+        with open_pdf(pdf) as doc:
+            text_to_analyze = _article_or_chapter_text(doc)
+        if text_to_analyze is None:
             return "journal"  # Default
 
-        # Analyze text from header, footer, and full first page for efficiency
-        text_to_analyze = ""
-        for i in range(min(doc.page_count, 5)): # Check first 5 pages
-            page = doc[i]
-            if i == 0: # Get full text of first page
-                text_to_analyze += page.get_text().lower() + "\n"
-            else: # Get only header/footer for other pages
-                rect = page.rect
-                header_rect = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * 0.15)
-                footer_rect = fitz.Rect(rect.x0, rect.y1 - rect.height * 0.15, rect.x1, rect.y1)
-                text_to_analyze += page.get_text(clip=header_rect).lower() + "\n"
-                text_to_analyze += page.get_text(clip=footer_rect).lower() + "\n"
-
         # --- Rule-Based Judging ---
 
         # Rule 1: High-confidence journal keywords
-        journal_knockout_keywords = [
-            'issn', 'journal', 'proceedings', 'zeitschrift', 'revue', 
-            '学报', '學報', '期刊', '雑誌', '紀要'  # S. Chinese, T. Chinese, Japanese
-        ]
-        for keyword in journal_knockout_keywords:
-            if keyword in text_to_analyze:
-                logging.info(f"Classified as JOURNAL based on knockout keyword: '{keyword}'")
-                doc.close()
-                return "journal"
+        journal_match = JOURNAL_KEYWORD_RE.search(text_to_analyze)
+        if journal_match:
+            logger.info("Classified as JOURNAL based on knockout keyword: '%s'", journal_match.group())
+            return "journal"
 
         # Rule 2: Journal-specific patterns
-        has_volume = re.search(r'\b(volume|vol\.)\b|第\s*\d+\s*卷', text_to_analyze)
-        has_issue = re.search(r'\b(issue|no\.)\b|第\s*\d+\s*期', text_to_analyze)
+        has_volume = VOLUME_RE.search(text_to_analyze)
+        has_issue = ISSUE_RE.search(text_to_analyze)
         if has_volume and has_issue:
-            logging.info("Classified as JOURNAL based on presence of 'volume'/'issue' or '卷'/'期'")
-            doc.close()
+            logger.info("Classified as JOURNAL based on presence of 'volume'/'issue' or '卷'/'期'")
             return "journal"
 
         # Rule 3: High-confidence chapter keywords (immediate decision)
-        chapter_knockout_keywords = [
-            'edited by', 'editor', 'isbn', 'press', 'herausgeber', 'éditeur', 
-            '主编', '主編', '出版社', '編者', 'プレス' # S. Chinese, T. Chinese, Japanese
-        ]
-        for keyword in chapter_knockout_keywords:
-            if keyword in text_to_analyze:
-                logging.info(f"Classified as BOOKCHAPTER based on knockout keyword: '{keyword}'")
-                doc.close()
-                return "bookchapter"
-
-        doc.close()
+        chapter_match = CHAPTER_KEYWORD_RE.search(text_to_analyze)
+        if chapter_match:
+            logger.info("Classified as BOOKCHAPTER based on knockout keyword: '%s'", chapter_match.group())
+            return "bookchapter"
 
     except Exception as e:
-        logging.error(f"Error during article/chapter differentiation: {e}")
+        logger.error("Error during article/chapter differentiation: %s", e)
         return "journal" # Default on error
 
     # Rule 4: Default
-    logging.info("No definitive indicators found. Defaulting to JOURNAL.")
+    logger.info("No definitive indicators found. Defaulting to JOURNAL.")
     return "journal"
 
 
-def determine_document_type(pdf_path: str, num_pages: int) -> str:
+def determine_document_type(pdf: Union[str, fitz.Document], num_pages: int) -> str:
     """
     Determines the document type by orchestrating checks for thesis, book,
     journal, or book chapter.
+
+    `pdf` is a path or an already opened document, which is left open.
     """
     if num_pages >= 70:
-        if is_thesis(pdf_path):
+        if is_thesis(pdf):
             return "thesis"
         else:
             return "book"
     else:
         # For shorter documents, differentiate between journal and chapter
-        return differentiate_article_or_chapter(pdf_path)
+        return differentiate_article_or_chapter(pdf)
 
 
 
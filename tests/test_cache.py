@@ -0,0 +1,56 @@
+from citation import cache
+
+
+def test_save_and_load_result(tmp_path, monkeypatch):
+    """Test that a stored result is returned for the same key."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    key = cache.make_key("digest", "auto", "eng", "1-5, -3", "ollama/qwen3")
+    data = {"id": "test", "type": "book", "title": "唐代僧籍管理制度"}
+
+    assert cache.load_result(key) is None
+    cache.save_result(key, data)
+    assert cache.load_result(key) == data
+
+
+def test_key_depends_on_every_part():
+    """Test that changing any settings part produces a different key."""
+    base = cache.make_key("digest", "auto", "eng")
+    assert cache.make_key("digest", "book", "eng") != base
+    assert cache.make_key("digest", "auto", "chi_sim") != base
+    assert cache.make_key("digest", "auto", "eng") == base
+
+
+def test_file_digest_tracks_content(tmp_path):
+    """Test that the file digest changes with the file content."""
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4 one")
+    first = cache.file_digest(str(pdf))
+    pdf.write_bytes(b"%PDF-1.4 two")
+    assert cache.file_digest(str(pdf)) != first
+
+
+def test_save_and_load_file(tmp_path, monkeypatch):
+    """Test that a cached file copy survives removal of the original."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    src = tmp_path / "ocr_tmp.pdf"
+    src.write_bytes(b"%PDF-1.4 searchable")
+
+    assert cache.load_file("key", "ocr", ".pdf") is None
+    cache.save_file("key", str(src), "ocr", ".pdf")
+    src.unlink()
+
+    with open(cache.load_file("key", "ocr", ".pdf"), "rb") as f:
+        assert f.read() == b"%PDF-1.4 searchable"
+
+
+def test_load_result_honours_max_age(tmp_path, monkeypatch):
+    """Test that entries older than max_age are treated as misses."""
+    import os
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    cache.save_result("key", {"title": "t"}, namespace="websearch")
+    path = os.path.join(cache.get_cache_dir("websearch"), "key.json")
+    os.utime(path, (0, 0))
+
+    assert cache.load_result("key", namespace="websearch", max_age=60) is None
+    assert cache.load_result("key", namespace="websearch") == {"title": "t"}
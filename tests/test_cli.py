@@ -0,0 +1,22 @@
+import pytest
+
+from citation import cli
+
+
+def test_missing_inputs_do_not_start_the_extractor(monkeypatch, capsys):
+    """Test that a run without any existing input fails before loading the model."""
+    from citation import main
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the extractor should not be built")
+
+    monkeypatch.setattr(main, "CitationExtractor", fail)
+    monkeypatch.setattr("sys.argv", ["citation", "missing.pdf", "gone.mp4"])
+
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main()
+    assert excinfo.value.code == 1
+    assert capsys.readouterr().err.splitlines() == [
+        "File does not exist: missing.pdf",
+        "File does not exist: gone.mp4",
+    ]
@@ -0,0 +1,27 @@
+from citation import llm, utils
+
+
+def test_preload_model_only_for_ollama(monkeypatch):
+    """Test that only Ollama models are preloaded, with a keep-alive."""
+    posts = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+    def fake_post(url, json, timeout):
+        posts.append((url, json))
+        return FakeResponse()
+
+    monkeypatch.setattr(utils.http_session, "post", fake_post)
+
+    llm.preload_model("gemini/gemini-1.5-flash")
+    assert posts == []
+
+    llm.preload_model("ollama/qwen3")
+    assert posts == [
+        (
+            "http://localhost:11434/api/generate",
+            {"model": "qwen3", "keep_alive": llm.OLLAMA_KEEP_ALIVE},
+        )
+    ]
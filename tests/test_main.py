@@ -0,0 +1,138 @@
+from citation import main
+
+
+def test_url_results_are_cached_by_clean_url(tmp_path, monkeypatch):
+    """Test that a URL differing only in tracking parameters hits the cache."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    extractor = main.CitationExtractor(preload=False)
+    calls = []
+
+    def fake_extract_from_url(url, output_dir, *args, **kwargs):
+        calls.append(url)
+        return {"id": "page", "type": "webpage", "title": "A page"}
+
+    monkeypatch.setattr(extractor, "extract_from_url", fake_extract_from_url)
+    output_dir = str(tmp_path / "out")
+
+    for url in ("https://example.org/a?utm_source=feed", "https://example.org/a"):
+        assert extractor.extract_citation(url, output_dir)["title"] == "A page"
+    assert len(calls) == 1
+
+    extractor.extract_citation("https://example.org/a", output_dir, use_cache=False)
+    assert len(calls) == 2
+    extractor.close()
+
+
+def test_media_results_are_cached_per_file_name(tmp_path, monkeypatch):
+    """Test that copies of a media file under other names are not shared."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    extractor = main.CitationExtractor(preload=False)
+    calls = []
+
+    def fake_extract_from_media_file(path, output_dir):
+        calls.append(path)
+        return {"id": "talk", "type": "motion_picture", "title": path}
+
+    monkeypatch.setattr(extractor, "extract_from_media_file", fake_extract_from_media_file)
+    output_dir = str(tmp_path / "out")
+    paths = []
+    for name in ("first_talk.mp4", "second_talk.mp4"):
+        path = tmp_path / name
+        path.write_bytes(b"same recording")
+        paths.append(str(path))
+
+    for path in paths + paths:
+        assert extractor.extract_citation(path, output_dir)["title"] == path
+    assert calls == paths
+    extractor.close()
+
+
+def test_failed_save_does_not_stop_the_writer(tmp_path, monkeypatch):
+    """Test that one failing write neither blocks later writes nor close()."""
+    extractor = main.CitationExtractor(preload=False)
+    written = []
+
+    def flaky_save(csl_data, output_dir):
+        if csl_data["id"] == "bad":
+            raise OSError("disk full")
+        written.append(csl_data["id"])
+
+    monkeypatch.setattr(main, "save_citation", flaky_save)
+    extractor._save({"id": "bad"}, str(tmp_path))
+    extractor._save({"id": "good"}, str(tmp_path))
+    extractor.flush()
+    assert written == ["good"]
+
+    thread = extractor._save_thread
+    extractor.close()
+    assert not thread.is_alive()
+    # After close() writes happen directly
+    extractor._save({"id": "late"}, str(tmp_path))
+    assert written == ["good", "late"]
+    extractor.close()
+
+
+def test_pdf_url_citation_is_written_once(tmp_path, monkeypatch):
+    """Test that a PDF served from a URL is saved once, with its URL and settings."""
+    extractor = main.CitationExtractor(preload=False)
+    saved = []
+    options = []
+    monkeypatch.setattr(main, "determine_url_type", lambda url: "pdf")
+    monkeypatch.setattr(main, "fetch_page", lambda url: b"%PDF-1.4")
+    monkeypatch.setattr(
+        extractor, "_save", lambda csl_data, output_dir: saved.append(csl_data)
+    )
+
+    def fake_extract_from_pdf(path, output_dir, url=None, **kwargs):
+        options.append(kwargs)
+        csl_data = main.to_csl_json(
+            {"title": "A paper", "url": url, "date_accessed": "2024-05-01"}, "journal"
+        )
+        extractor._save(csl_data, output_dir)
+        return csl_data
+
+    monkeypatch.setattr(extractor, "extract_from_pdf", fake_extract_from_pdf)
+
+    csl_data = extractor.extract_from_url(
+        "https://example.org/paper", str(tmp_path), "thesis", "eng", "1-2", False, 6
+    )
+    assert csl_data["URL"] == "https://example.org/paper"
+    assert saved == [csl_data]
+    # The caller's PDF settings reach the PDF workflow
+    assert options == [
+        {
+            "doc_type_override": "thesis",
+            "lang": "eng",
+            "page_range": "1-2",
+            "use_cache": False,
+            "psm": 6,
+        }
+    ]
+    extractor.close()
+
+
+def test_trafilatura_failure_falls_back_to_crawl4ai(monkeypatch):
+    """Test that an error in trafilatura's text extraction still tries crawl4ai."""
+    from concurrent.futures import Future
+
+    import trafilatura
+
+    extractor = main.CitationExtractor(preload=False)
+    crawled = []
+
+    def broken_extract(*args, **kwargs):
+        raise TypeError("unsupported output format")
+
+    async def fake_crawl(url):
+        crawled.append(url)
+        return ""
+
+    monkeypatch.setattr(trafilatura, "extract", broken_extract)
+    monkeypatch.setattr(trafilatura, "extract_metadata", lambda page: None)
+    monkeypatch.setattr(extractor, "_extract_with_crawl4ai", fake_crawl)
+    page_download = Future()
+    page_download.set_result(b"<html><body>text</body></html>")
+
+    extractor._extract_from_text_url("https://example.org/a", page_download)
+    assert crawled == ["https://example.org/a"]
+    extractor.close()
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("dspy")
+
+import fitz  # noqa: E402
+
+from citation.model import ImprovedPageNumberExtractor  # noqa: E402
+
+
+def _article(folios):
+    """Build a document with body text and the given footer folios."""
+    doc = fitz.open()
+    for folio in folios:
+        page = doc.new_page()
+        page.insert_textbox(
+            page.rect + (72, 120, -72, -120), "Body text of the article. " * 30, fontsize=11
+        )
+        if folio is not None:
+            page.insert_text((290, page.rect.height - 30), str(folio), fontsize=9)
+    return doc
+
+
+def test_guess_range_from_end_pages():
+    """Test reading the page range from the first and last page folios."""
+    extractor = ImprovedPageNumberExtractor()
+
+    assert extractor.guess_range_from_end_pages(_article([20, None, None, 41])) == "20-41"
+    # A range shorter than the document is not a page range
+    assert extractor.guess_range_from_end_pages(_article([20, None, None, 21])) is None
+    assert extractor.guess_range_from_end_pages(_article([None, None, 41])) is None
+
+
+def test_truncate_text_caps_characters():
+    """Test that text without spaces is still cut to head and tail."""
+    from citation.model import CitationLLM
+
+    llm = CitationLLM.__new__(CitationLLM)
+    text = "唐" * 6000 + "尾" * 2000 + "末" * 2000
+
+    truncated = llm._truncate_text(text, max_chars=8000)
+    head, tail = truncated.split("\n...\n")
+    assert head == "唐" * 6000
+    assert tail == "末" * 2000
+    assert llm._truncate_text("short", max_chars=8000) == "short"
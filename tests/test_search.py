@@ -0,0 +1,95 @@
+from citation import search
+
+
+class FakeResponse:
+    def __init__(self, items):
+        self._items = items
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"message": {"items": self._items}}
+
+
+def test_search_crossref_match_is_cached(tmp_path, monkeypatch):
+    """Test that a close CrossRef match is parsed and served from cache."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        return FakeResponse(
+            [
+                {
+                    "title": ["Buddhist Monastic Registers in the Tang"],
+                    "container-title": ["Journal of Chinese Religions"],
+                    "publisher": "Informa UK Limited",
+                    "issued": {"date-parts": [[2019, 5]]},
+                    "volume": "47",
+                    "page": "1-25",
+                    "DOI": "10.1000/jcr.2019.1",
+                }
+            ]
+        )
+
+    monkeypatch.setattr(search.http_session, "get", fake_get)
+    title = "Buddhist monastic registers in the Tang"
+
+    expected = {
+        "container-title": "Journal of Chinese Religions",
+        "publisher": "Informa UK Limited",
+        "year": "2019",
+        "volume": "47",
+        "page_numbers": "1-25",
+        "doi": "10.1000/jcr.2019.1",
+    }
+    assert search.search_crossref(title) == expected
+    assert search.search_crossref(title) == expected
+    assert len(calls) == 1
+
+
+def test_search_crossref_rejects_unrelated_hit(tmp_path, monkeypatch):
+    """Test that a top hit with a different title is not used."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(
+        search.http_session,
+        "get",
+        lambda *a, **k: FakeResponse([{"title": ["Something else entirely"]}]),
+    )
+    assert search.search_crossref("Buddhist monastic registers") == {}
+
+
+def test_search_crossref_does_not_cache_failures(tmp_path, monkeypatch):
+    """Test that a failed request is retried and a miss expires."""
+    import os
+
+    from citation import cache
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    calls = []
+
+    def failing_get(*args, **kwargs):
+        calls.append(args)
+        raise search.requests.exceptions.Timeout("timed out")
+
+    monkeypatch.setattr(search.http_session, "get", failing_get)
+    assert search.search_crossref("Buddhist monastic registers") == {}
+    assert search.search_crossref("Buddhist monastic registers") == {}
+    assert len(calls) == 2
+
+    def missing_get(*args, **kwargs):
+        calls.append(args)
+        return FakeResponse([])
+
+    monkeypatch.setattr(search.http_session, "get", missing_get)
+    assert search.search_crossref("Buddhist monastic registers") == {}
+    assert search.search_crossref("Buddhist monastic registers") == {}
+    assert len(calls) == 3
+
+    # Once the miss is older than its TTL, CrossRef is asked again
+    miss_dir = cache.get_cache_dir("crossref_miss")
+    for name in os.listdir(miss_dir):
+        os.utime(os.path.join(miss_dir, name), (0, 0))
+    search.search_crossref("Buddhist monastic registers")
+    assert len(calls) == 4
@@ -43,4 +43,25 @@ def test_format_bibliography_not_found_style():
     bibliography, in_text = format_bibliography(csl_data, style)
     
     assert "Error: Style 'non-existent-style' not found." in bibliography
-    assert in_text == ""
\ No newline at end of file
+    assert in_text == ""
+
+def test_format_bibliography_does_not_cache_failures(monkeypatch):
+    """Test that a failed formatting is retried on the next call."""
+    from citation import citation_style
+
+    csl_data = [{"id": "retry", "type": "book", "title": "Retry Book"}]
+    outcomes = [RuntimeError("style load failed"), ("Retry Book.", "(Retry)")]
+
+    def flaky(data, style_path):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(citation_style, "_format_bibliography", flaky)
+    citation_style._format_bibliography_cached.cache_clear()
+
+    bibliography, _ = format_bibliography(csl_data, "chicago-author-date")
+    assert bibliography.startswith("Error during formatting")
+    assert format_bibliography(csl_data, "chicago-author-date") == ("Retry Book.", "(Retry)")
+    citation_style._format_bibliography_cached.cache_clear()
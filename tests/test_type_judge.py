@@ -0,0 +1,21 @@
+import fitz
+
+from citation.type_judge import determine_document_type
+
+
+def _doc(text, pages=1):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page().insert_text((72, 72), text)
+    return doc
+
+
+def test_determine_document_type_accepts_open_document():
+    """Test classification on an open document, which stays open."""
+    doc = _doc("Journal of Buddhist Studies, Vol. 3")
+    assert determine_document_type(doc, 20) == "journal"
+    assert not doc.is_closed
+
+    assert determine_document_type(_doc("Edited by A. Editor"), 20) == "bookchapter"
+    assert determine_document_type(_doc("PhD thesis"), 200) == "thesis"
+    assert determine_document_type(_doc("A monograph"), 200) == "book"
@@ -0,0 +1,460 @@
+import sys
+
+from citation.utils import default_ocr_jobs, ocr_jobs_per_document
+
+
+def test_default_ocr_jobs(monkeypatch):
+    """Test OCR worker sizing with and without Tesseract's own threads."""
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    assert default_ocr_jobs(3) == 3
+    assert default_ocr_jobs(20) == 8
+    # OpenMP left enabled: only a quarter of the cores get workers
+    assert default_ocr_jobs(20, omp_thread_limit="4") == 2
+    assert default_ocr_jobs(0) == 1
+    # Documents OCR'd side by side split the CPUs between them
+    assert ocr_jobs_per_document(1) == 8
+    assert ocr_jobs_per_document(3) == 2
+    assert ocr_jobs_per_document(16) == 1
+
+
+def test_ensure_searchable_pdf_limits_ocr_pages(tmp_path, monkeypatch):
+    """Test that only pages lacking a text layer are handed to ocrmypdf."""
+    import fitz
+
+    from citation import utils
+
+    pdf = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    for number in range(4):
+        page = doc.new_page()
+        if number == 1:
+            page.insert_textbox(page.rect + (50, 50, -50, -50), "citation text " * 40)
+        elif number == 2:
+            page.insert_text((50, 50), "Running title")
+    doc.save(pdf)
+    doc.close()
+
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return utils.subprocess.CompletedProcess(cmd, 0, "", "")
+
+    # Exercise the command-line fallback
+    monkeypatch.setitem(sys.modules, "ocrmypdf", None)
+    monkeypatch.setattr(utils.subprocess, "run", fake_run)
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    utils.ensure_searchable_pdf(str(pdf), "eng", psm=6)
+
+    cmd = calls[0]
+    assert cmd[cmd.index("--pages") + 1] == "1,3,4"
+    assert cmd[cmd.index("--jobs") + 1] == "3"
+    assert cmd[cmd.index("--language") + 1] == "eng"
+    # Existing text is kept rather than rasterized
+    assert "--redo-ocr" in cmd
+    assert "--force-ocr" not in cmd and "--deskew" not in cmd
+    assert cmd[cmd.index("--tesseract-oem") + 1] == "1"
+    assert cmd[cmd.index("--tesseract-pagesegmode") + 1] == "6"
+    assert cmd[cmd.index("--sidecar") + 1] == str(tmp_path / "ocr_scan.txt")
+
+    # A scan without any text layer is OCR'd and deskewed in full
+    blank = tmp_path / "blank.pdf"
+    doc = fitz.open()
+    doc.new_page()
+    doc.new_page()
+    doc.save(blank)
+    doc.close()
+    utils.ensure_searchable_pdf(str(blank), "eng")
+    cmd = calls[1]
+    assert cmd[cmd.index("--pages") + 1] == "1,2"
+    assert "--force-ocr" in cmd and "--deskew" in cmd
+
+
+def test_create_subset_pdf_reuses_open_document(tmp_path):
+    """Test that a caller-owned document is used and left open."""
+    import os
+
+    import fitz
+
+    from citation.utils import create_subset_pdf
+
+    source = fitz.open()
+    for _ in range(10):
+        source.new_page()
+
+    subset_path = create_subset_pdf(
+        str(tmp_path / "unused.pdf"), "1-2, -1", source.page_count, source_doc=source
+    )
+    try:
+        assert not source.is_closed
+        with fitz.open(subset_path) as subset:
+            assert subset.page_count == 3
+    finally:
+        os.remove(subset_path)
+        source.close()
+
+
+def test_extract_html_meta():
+    """Test reading citation fields from meta tags."""
+    from citation.utils import extract_html_meta
+
+    html = """<html><head>
+    <meta name="citation_title" content="On Monks">
+    <meta name="citation_author" content="Li Bai">
+    <meta name="citation_author" content="Du Fu">
+    <meta name="DC.Date" content="2021-05-01">
+    <meta property="og:site_name" content="Example Review">
+    </head><body></body></html>"""
+
+    assert extract_html_meta(html) == {
+        "title": "On Monks",
+        "author": "Li Bai; Du Fu",
+        "date": "2021-05-01",
+        "container-title": "Example Review",
+    }
+    assert extract_html_meta("") == {}
+
+
+def test_has_text_layer():
+    """Test the text-layer heuristic on text and blank pages."""
+    import fitz
+
+    from citation.utils import has_text_layer
+
+    doc = fitz.open()
+    for _ in range(6):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), "citation text " * 40)
+    assert has_text_layer(doc)
+
+    blank = fitz.open()
+    blank.new_page()
+    page = blank.new_page()
+    page.insert_text((50, 50), "Chapter 1")
+    assert not has_text_layer(blank)
+    assert not has_text_layer(fitz.open())
+
+
+def test_pages_without_text():
+    """Test that blank pages and pages with only a heading need OCR."""
+    import fitz
+
+    from citation.utils import pages_without_text
+
+    doc = fitz.open()
+    doc.new_page()
+    page = doc.new_page()
+    page.insert_text((50, 50), "Chapter 1")
+    page = doc.new_page()
+    page.insert_textbox(page.rect + (50, 50, -50, -50), "citation text " * 40)
+
+    assert pages_without_text(doc) == [1, 2]
+    assert pages_without_text(fitz.open()) == []
+
+
+def test_read_ocr_sidecar(tmp_path):
+    """Test splitting the OCR sidecar into pages and dropping skipped ones."""
+    from citation.utils import read_ocr_sidecar
+
+    pdf = tmp_path / "ocr_scan.pdf"
+    assert read_ocr_sidecar(str(pdf)) is None
+
+    (tmp_path / "ocr_scan.txt").write_text(
+        "Title page\f[OCR skipped on page 2]\f第三頁", encoding="utf-8"
+    )
+    assert read_ocr_sidecar(str(pdf)) == ["Title page", None, "第三頁"]
+
+
+def test_fetch_page_returns_none_on_http_error(monkeypatch):
+    """Test that a failed download is reported as None, not raised."""
+    import requests
+
+    from citation import utils
+
+    def fail(url, timeout, stream):
+        raise requests.exceptions.ConnectionError("unreachable")
+
+    monkeypatch.setattr(utils.http_session, "get", fail)
+    assert utils.fetch_page("https://example.org/article") is None
+    assert utils.http_session.get_adapter("https://example.org").max_retries.total == 2
+
+
+def test_fetch_page_skips_non_document_bodies(monkeypatch):
+    """Test that media and oversized bodies are dropped without being read."""
+    from citation import utils
+
+    class FakeResponse:
+        def __init__(self, content_type, chunks):
+            self.headers = {"content-type": content_type}
+            self.chunks = chunks
+            self.read = False
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            self.read = True
+            return iter(self.chunks)
+
+    responses = {
+        "https://example.org/page": FakeResponse("text/html", [b"<html>", b"</html>"]),
+        "https://example.org/talk": FakeResponse("video/mp4", [b"\0" * 10]),
+        "https://example.org/big.pdf": FakeResponse("application/pdf", [b"%PDF"] * 4),
+    }
+    monkeypatch.setattr(
+        utils.http_session, "get", lambda url, **kwargs: responses[url]
+    )
+
+    assert utils.fetch_page("https://example.org/page") == b"<html></html>"
+    assert utils.fetch_page("https://example.org/talk") is None
+    assert not responses["https://example.org/talk"].read
+    assert utils.fetch_page("https://example.org/big.pdf", max_bytes=10) is None
+
+
+def test_extract_pdf_text_accepts_open_document(tmp_path):
+    """Test that page text can be read from a path or an open document."""
+    import fitz
+
+    from citation.utils import extract_pdf_text
+
+    pdf = tmp_path / "two.pdf"
+    doc = fitz.open()
+    for text in ("first page", "second page"):
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(pdf)
+    doc.close()
+
+    assert "second page" in extract_pdf_text(str(pdf), 1)
+    with fitz.open(pdf) as doc:
+        assert "first page" in extract_pdf_text(doc, 0)
+        assert extract_pdf_text(doc, 5) == ""
+        # The caller's document stays open
+        assert not doc.is_closed
+
+
+def test_ensure_searchable_pdf_skips_ocr_for_text_pdf(tmp_path, monkeypatch):
+    """Test that a born-digital subset with a short title page is not OCR'd."""
+    import fitz
+
+    from citation import utils
+
+    pdf = tmp_path / "born_digital.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 50), "A Title")
+    for _ in range(3):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), "citation text " * 40)
+    doc.save(pdf)
+    doc.close()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("OCR should not run")
+
+    monkeypatch.setattr(utils, "_run_ocrmypdf", fail)
+    assert utils.ensure_searchable_pdf(str(pdf)) == (str(pdf), True)
+
+
+def test_ensure_searchable_pdf_reports_ocr_failure(tmp_path, monkeypatch):
+    """Test that a failed OCR run returns the original path, marked as failed."""
+    import fitz
+
+    from citation import utils
+
+    pdf = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(pdf)
+    doc.close()
+
+    monkeypatch.setattr(utils, "_run_ocrmypdf", lambda *args: False)
+    assert utils.ensure_searchable_pdf(str(pdf)) == (str(pdf), False)
+
+
+def test_clean_url_and_publisher_from_domain():
+    """Test tracking-parameter removal and domain-based publisher names."""
+    from citation.utils import clean_url, extract_publisher_from_domain
+
+    url = "https://www.nytimes.com/a.html?id=7&utm_source=x&fbclid=y"
+    assert clean_url(url) == "https://www.nytimes.com/a.html?id=7"
+    assert clean_url(url) == clean_url(url)
+    assert extract_publisher_from_domain(url) == "New York Times"
+    assert extract_publisher_from_domain("https://example.org/x") == "Example"
+
+
+def test_publisher_lookup_is_shared_per_host():
+    """Test that pages of one host reuse a single memoized lookup."""
+    from citation import utils
+
+    utils._publisher_for_netloc.cache_clear()
+    for page in ("a", "b?utm_source=x", "c#top"):
+        utils.extract_publisher_from_domain(f"https://www.nature.com/{page}")
+    info = utils._publisher_for_netloc.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+
+def test_run_ocrmypdf_limits_threads_only_in_subprocess(monkeypatch):
+    """Test that OMP_THREAD_LIMIT goes to the subprocess, not this process."""
+    import os
+    import threading
+
+    from citation import utils
+
+    calls = []
+
+    def fake_run(cmd, env, **kwargs):
+        calls.append(env)
+        return utils.subprocess.CompletedProcess(cmd, 0, "", "")
+
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    monkeypatch.setattr(utils.subprocess, "run", fake_run)
+
+    assert utils._run_ocrmypdf("in.pdf", "out.pdf", {"jobs": 2})
+    assert calls[0]["OMP_THREAD_LIMIT"] == "1"
+    assert "OMP_THREAD_LIMIT" not in os.environ
+
+    # The in-process API is opt-in and never used from worker threads
+    monkeypatch.setattr(utils, "OCR_IN_PROCESS", True)
+    assert utils._ocr_in_process()
+    results = []
+    worker = threading.Thread(target=lambda: results.append(utils._ocr_in_process()))
+    worker.start()
+    worker.join()
+    assert results == [False]
+
+
+def test_determine_url_type_memoizes_head_requests(monkeypatch):
+    """Test that known platforms skip HEAD and other URLs send it once."""
+    from citation import utils
+
+    heads = []
+
+    class FakeResponse:
+        headers = {"content-type": "video/mp4"}
+
+    def fake_head(url, timeout, allow_redirects):
+        heads.append(url)
+        return FakeResponse()
+
+    monkeypatch.setattr(utils.http_session, "head", fake_head)
+    utils._head_content_type.cache_clear()
+
+    assert utils.determine_url_type("https://www.youtube.com/watch?v=1") == "media"
+    assert utils.determine_url_type("https://example.org/files/talk.mp3") == "media"
+    assert heads == []
+    for _ in range(2):
+        assert utils.determine_url_type("https://example.org/talk") == "media"
+    assert heads == ["https://example.org/talk"]
+    utils._head_content_type.cache_clear()
+
+
+def test_determine_url_type_recognizes_non_html(monkeypatch):
+    """Test that PDFs and other binary bodies are told apart from pages."""
+    from citation import utils
+
+    content_types = {
+        "https://example.org/paper": "application/pdf",
+        "https://example.org/photo": "image/png",
+        "https://example.org/page": "text/html; charset=utf-8",
+        "https://example.org/feed": "application/xhtml+xml",
+    }
+
+    class FakeResponse:
+        def __init__(self, url):
+            self.headers = {"content-type": content_types[url]}
+
+    monkeypatch.setattr(
+        utils.http_session, "head", lambda url, **kwargs: FakeResponse(url)
+    )
+    utils._head_content_type.cache_clear()
+
+    assert utils.determine_url_type("https://example.org/paper") == "pdf"
+    assert utils.determine_url_type("https://example.org/photo") == "binary"
+    assert utils.determine_url_type("https://example.org/page") == "text"
+    assert utils.determine_url_type("https://example.org/feed") == "text"
+    utils._head_content_type.cache_clear()
+
+
+def test_extract_html_meta_reads_head_only():
+    """Test that meta tags in bytes input are read and the body is skipped."""
+    from citation.utils import extract_html_meta
+
+    html = (
+        '<html><head><meta charset="gbk">'
+        '<meta name="Citation_Title" content="唐代僧籍">'
+        "</head><body>"
+        '<meta name="citation_author" content="Body Tag">'
+        "</body></html>"
+    ).encode("gbk")
+
+    assert extract_html_meta(html) == {"title": "唐代僧籍"}
+
+
+def test_input_type_checks(tmp_path):
+    """Test PDF detection by header and media detection by extension."""
+    from citation.utils import has_media_extension, is_media_file, is_pdf_file
+
+    pdf = tmp_path / "renamed.bin"
+    pdf.write_bytes(b"%PDF-1.7\n")
+    assert is_pdf_file(str(pdf))
+    assert not is_pdf_file(str(tmp_path / "missing.pdf"))
+
+    assert has_media_extension("/videos/talk.MP4")
+    assert not has_media_extension("/articles/talk.html")
+    # Media files must exist locally, URL paths only need the extension
+    assert not is_media_file(str(tmp_path / "talk.mp4"))
+
+
+def test_sniff_file_type_reads_headers(tmp_path):
+    """Test that media files without a known extension are told by header."""
+    from citation.utils import is_media_file, sniff_file_type
+
+    samples = {
+        "paper": b"%PDF-1.4\n",
+        "clip": b"\x00\x00\x00\x20ftypisom",
+        "song": b"ID3\x04\x00",
+        "notes": b"plain text",
+        "wave": b"RIFF\x24\x00\x00\x00WAVEfmt ",
+        "photo.webp": b"RIFF\x24\x00\x00\x00WEBPVP8 ",
+        "photo.heic": b"\x00\x00\x00\x18ftypheic",
+        "photo.avif": b"\x00\x00\x00\x1cftypavif",
+    }
+    for name, header in samples.items():
+        (tmp_path / name).write_bytes(header)
+
+    assert sniff_file_type(str(tmp_path / "paper")) == "pdf"
+    assert sniff_file_type(str(tmp_path / "clip")) == "media"
+    assert is_media_file(str(tmp_path / "song"))
+    assert sniff_file_type(str(tmp_path / "notes")) is None
+    assert sniff_file_type(str(tmp_path / "wave")) == "media"
+    # Image formats sharing the RIFF and ISO media containers are not media
+    for name in ("photo.webp", "photo.heic", "photo.avif"):
+        assert sniff_file_type(str(tmp_path / name)) is None
+        assert not is_media_file(str(tmp_path / name))
+    assert sniff_file_type(str(tmp_path / "missing")) is None
+
+
+def test_http_session_sends_trafilatura_user_agent():
+    """Test that the shared session identifies itself like trafilatura."""
+    from citation import utils
+
+    assert utils.http_session.headers["User-Agent"] == utils.USER_AGENT
+    assert utils.http_session.get_adapter("https://example.org")._pool_maxsize == 64
+
+
+def test_save_citation_leaves_no_temporary_files(tmp_path):
+    """Test that citations are written whole and temporary files removed."""
+    import json
+
+    from citation.utils import save_citation
+
+    save_citation({"id": "test", "title": "唐代僧籍管理制度"}, str(tmp_path))
+
+    assert [p.name for p in tmp_path.iterdir()] == ["test.json"]
+    with open(tmp_path / "test.json", encoding="utf-8") as f:
+        assert json.load(f)["title"] == "唐代僧籍管理制度"